@@ -1,5 +1,7 @@
 import streamlit as st
-from collections import defaultdict
+
+import ledger
+import local_store
 
 st.set_page_config(page_title="Trip Expense Splitter", layout="centered")
 
@@ -17,8 +19,10 @@ default_participants = [
 # ----- Session State Initialization -----
 if 'participants' not in st.session_state:
     st.session_state.participants = default_participants.copy()
+# Kept in the local SQLite store so a restart does not lose them (see local_store.py)
+LOCAL_TRIP = "app"
 if 'expenses' not in st.session_state:
-    st.session_state.expenses = []
+    st.session_state.expenses = local_store.get_store().expenses("", LOCAL_TRIP)
 
 # ----- Title -----
 st.title("🏝️ Mulki Trip Expense Splitter")
@@ -45,6 +49,7 @@ if st.button("Add Expense"):
             "paid_by": paid_by,
             "split_between": split_between
         })
+        local_store.get_store().add_expense("", LOCAL_TRIP, st.session_state.expenses[-1])
         st.success("Expense added!")
     else:
         st.warning("Please fill all fields.")
@@ -62,31 +67,8 @@ if st.session_state.expenses:
 if st.session_state.expenses:
     st.subheader("📊 Who Owes Whom")
 
-    balances = defaultdict(float)
-
-    for exp in st.session_state.expenses:
-        share = exp["amount"] / len(exp["split_between"])
-        for p in exp["split_between"]:
-            if p != exp["paid_by"]:
-                balances[p] -= share
-                balances[exp["paid_by"]] += share
-
-    def get_optimized_transactions(bal):
-        pay = {k: round(v, 2) for k, v in bal.items() if v < 0}
-        receive = {k: round(v, 2) for k, v in bal.items() if v > 0}
-        transactions = []
-        for debtor, d_amt in pay.items():
-            for creditor, c_amt in receive.items():
-                if d_amt == 0:
-                    break
-                amt = min(-d_amt, c_amt)
-                if amt > 0:
-                    transactions.append((debtor, creditor, amt))
-                    pay[debtor] += amt
-                    receive[creditor] -= amt
-        return transactions
-
-    txns = get_optimized_transactions(balances)
+    # Same ledger math as every other page and the ledger.py CLI
+    txns = ledger.settle_trip(LOCAL_TRIP, st.session_state.expenses, st.session_state.participants, split_key="split_between").settlement.transactions
 
     if txns:
         for debtor, creditor, amt in txns:
@@ -98,4 +80,5 @@ if st.session_state.expenses:
 st.markdown("---")
 if st.button("🧹 Reset All Data"):
     st.session_state.expenses = []
+    local_store.get_store().clear("", LOCAL_TRIP)
     st.success("All expenses cleared!")
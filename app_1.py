@@ -1,6 +1,9 @@
 import streamlit as st
 from collections import defaultdict
 
+import local_store
+import settlement
+
 st.set_page_config(page_title="Trip Splitter", layout="centered")
 
 # --- Initial Participants & Categories ---
@@ -8,8 +11,10 @@ participants = ["CR", "PALLE", "DOG", "NANI", "BABA", "VACHU", "GODA"]
 default_categories = ["Food", "Fuel", "Stay", "Travel", "Activities", "Misc"]
 
 # --- Session State Init ---
+# Kept in the local SQLite store so a restart does not lose them (see local_store.py)
+LOCAL_TRIP = "app_1"
 if 'expenses' not in st.session_state:
-    st.session_state.expenses = []
+    st.session_state.expenses = local_store.get_store().expenses("", LOCAL_TRIP)
 if 'categories' not in st.session_state:
     st.session_state.categories = default_categories.copy()
 
@@ -43,6 +48,7 @@ if st.button("Add Expense"):
             "description": description,
             "category": category
         })
+        local_store.get_store().add_expense("", LOCAL_TRIP, st.session_state.expenses[-1])
         st.success(f"Added ₹{amount:.2f} by {paid_by} under {category}")
     else:
         st.warning("Please enter a valid amount and payer.")
@@ -76,30 +82,7 @@ if st.session_state.expenses:
     # --- Final Settlements ---
     st.subheader("🔁 Who Owes Whom")
 
-    def optimize_settlements(bal):
-        creditors = {k: v for k, v in bal.items() if v > 0}
-        debtors = {k: -v for k, v in bal.items() if v < 0}
-        txns = []
-
-        creditors = dict(sorted(creditors.items(), key=lambda x: -x[1]))
-        debtors = dict(sorted(debtors.items(), key=lambda x: -x[1]))
-
-        for d in debtors:
-            for c in creditors:
-                if debtors[d] == 0:
-                    break
-                if creditors[c] == 0:
-                    continue
-
-                amt = round(min(debtors[d], creditors[c]), 2)
-                if amt > 0:
-                    txns.append((d, c, amt))
-                    debtors[d] -= amt
-                    creditors[c] -= amt
-
-        return txns
-
-    transactions = optimize_settlements(balances)
+    transactions = settlement.settle(balances).transactions
 
     if transactions:
         for frm, to, amt in transactions:
@@ -1,5 +1,8 @@
 import streamlit as st
-from collections import defaultdict
+
+import balance_engine
+import local_store
+import settlement
 
 st.set_page_config(page_title="Trip Splitter", layout="wide")
 
@@ -8,8 +11,10 @@ participants = ["CR", "PALLE", "DOG", "NANI", "BABA", "VACHU", "GODA"]
 default_categories = ["Food", "Fuel", "Stay", "Travel", "Activities", "Misc"]
 
 # --- Session State Init ---
+# Kept in the local SQLite store so a restart does not lose them (see local_store.py)
+LOCAL_TRIP = "app_3"
 if 'expenses' not in st.session_state:
-    st.session_state.expenses = []
+    st.session_state.expenses = local_store.get_store().expenses("", LOCAL_TRIP)
 if 'categories' not in st.session_state:
     st.session_state.categories = default_categories.copy()
 
@@ -23,17 +28,7 @@ with sidebar:
     if st.session_state.expenses:
         if st.toggle("Show Trip Summary"):
             total = sum(e['amount'] for e in st.session_state.expenses)
-            person_spent = defaultdict(float)
-            for e in st.session_state.expenses:
-                person_spent[e['paid_by']] += e['amount']
-
-            person_owes = defaultdict(float)
-            for e in st.session_state.expenses:
-                share = e['amount'] / len(e['included'])
-                for p in e['included']:
-                    person_owes[p] += share
-
-            balances = {p: round(person_spent[p] - person_owes[p], 2) for p in participants}
+            balances = balance_engine.compute_balances(st.session_state.expenses, participants)
 
             st.subheader("💰 Total Trip Cost")
             st.metric("Total", f"₹{total:.2f}")
@@ -48,26 +43,7 @@ with sidebar:
                         st.info(f"💤 {p}: Settled")
 
             if st.toggle("🔁 Show Who Owes Whom"):
-                def optimize_settlements(bal):
-                    creditors = {k: v for k, v in bal.items() if v > 0}
-                    debtors = {k: -v for k, v in bal.items() if v < 0}
-                    txns = []
-                    creditors = dict(sorted(creditors.items(), key=lambda x: -x[1]))
-                    debtors = dict(sorted(debtors.items(), key=lambda x: -x[1]))
-                    for d in debtors:
-                        for c in creditors:
-                            if debtors[d] == 0:
-                                break
-                            if creditors[c] == 0:
-                                continue
-                            amt = round(min(debtors[d], creditors[c]), 2)
-                            if amt > 0:
-                                txns.append((d, c, amt))
-                                debtors[d] -= amt
-                                creditors[c] -= amt
-                    return txns
-
-                transactions = optimize_settlements(balances)
+                transactions = settlement.settle(balances).transactions
                 if transactions:
                     for frm, to, amt in transactions:
                         st.write(f"👉 `{frm}` owes `{to}` ₹{amt:.2f}")
@@ -108,6 +84,7 @@ with main:
                 "category": category,
                 "included": included_people
             })
+            local_store.get_store().add_expense("", LOCAL_TRIP, st.session_state.expenses[-1])
             st.success(f"Added ₹{amount:.2f} by {paid_by} under {category}")
         else:
             st.warning("Please enter all fields including category.")
\ No newline at end of file
@@ -1,9 +1,8 @@
 import streamlit as st
-from collections import defaultdict
-import pandas as pd
-import matplotlib.pyplot as plt
 from datetime import datetime
 
+import local_store
+
 st.set_page_config(page_title="Trip Splitter", layout="wide")
 
 # --- Initial Participants & Categories ---
@@ -11,8 +10,10 @@ participants = ["CR", "PALLE", "DOG", "NANI", "BABA", "VACHU", "GODA"]
 default_categories = ["Food", "Fuel", "Stay", "Travel", "Activities", "Misc"]
 
 # --- Session State Init ---
+# Kept in the local SQLite store so a restart does not lose them (see local_store.py)
+LOCAL_TRIP = "app_7"
 if 'expenses' not in st.session_state:
-    st.session_state.expenses = []
+    st.session_state.expenses = local_store.get_store().expenses("", LOCAL_TRIP)
 if 'categories' not in st.session_state:
     st.session_state.categories = default_categories.copy()
 
@@ -50,6 +51,7 @@ if st.button("Add Expense"):
             "included": included_people,
             "timestamp": datetime.now().strftime("%Y-%m-%d")
         })
+        local_store.get_store().add_expense("", LOCAL_TRIP, st.session_state.expenses[-1])
         st.success(f"Added ₹{amount:.2f} by {paid_by} under {category}")
     else:
         st.warning("Please enter all fields including category.")
@@ -61,33 +63,24 @@ st.subheader("🔒 View Trip Summary (Protected)")
 password = st.text_input("Enter password to view history", type="password")
 
 if password == "mulki2024":
-    if st.session_state.expenses:
-        total = sum(e['amount'] for e in st.session_state.expenses)
-        person_spent = defaultdict(float)
-        category_spent = defaultdict(float)
+    # Analytics and plotting only load once the summary is opened
+    import pandas as pd
 
-        for e in st.session_state.expenses:
-            person_spent[e['paid_by']] += e['amount']
-            category_spent[e['category']] += e['amount']
+    import balance_engine
+    import charts
+    import settlement
 
-        person_owes = defaultdict(float)
-        for e in st.session_state.expenses:
-            share = e['amount'] / len(e['included'])
-            for p in e['included']:
-                person_owes[p] += share
-
-        balances = {p: round(person_spent[p] - person_owes[p], 2) for p in participants}
+    if st.session_state.expenses:
+        total = sum(e['amount'] for e in st.session_state.expenses)
+        category_spent = balance_engine.category_totals(st.session_state.expenses)
+        balances = balance_engine.compute_balances(st.session_state.expenses, participants)
 
         st.subheader("💰 Total Trip Cost")
         st.metric("Total", f"₹{total:.2f}")
 
         st.subheader("📊 Category-wise Expense Breakdown")
         if category_spent:
-            df_cat = pd.DataFrame(list(category_spent.items()), columns=["Category", "Amount"])
-            fig, ax = plt.subplots()
-            ax.pie(df_cat["Amount"], labels=df_cat["Category"], autopct="%1.1f%%", startangle=90)
-            ax.axis("equal")
-            st.pyplot(fig)
+            st.image(charts.pie_chart(category_spent))
 
         if st.toggle("🗓️ Show Day-wise Expense Log"):
             df_exp = pd.DataFrame(st.session_state.expenses)
@@ -98,11 +91,8 @@ if password == "mulki2024":
                 for _, row in df_day.iterrows():
                     st.write(f"💸 `{row['paid_by']}` paid ₹{row['amount']:.2f} for *{row['description']}* [{row['category']}] (Split among: {', '.join(row['included'])})")
                 # Day-wise pie chart
-                cat_day = df_day.groupby("category")["amount"].sum().reset_index()
-                fig_day, ax_day = plt.subplots()
-                ax_day.pie(cat_day["amount"], labels=cat_day["category"], autopct="%1.1f%%", startangle=90)
-                ax_day.axis("equal")
-                st.pyplot(fig_day)
+                cat_day = df_day.groupby("category")["amount"].sum()
+                st.image(charts.pie_chart(cat_day.to_dict()))
 
         if st.toggle("📋 Show Net Balances"):
             for p, b in balances.items():
@@ -114,26 +104,7 @@ if password == "mulki2024":
                     st.info(f"💤 {p}: Settled")
 
         if st.toggle("🔁 Show Who Owes Whom"):
-            def optimize_settlements(bal):
-                creditors = {k: v for k, v in bal.items() if v > 0}
-                debtors = {k: -v for k, v in bal.items() if v < 0}
-                txns = []
-                creditors = dict(sorted(creditors.items(), key=lambda x: -x[1]))
-                debtors = dict(sorted(debtors.items(), key=lambda x: -x[1]))
-                for d in debtors:
-                    for c in creditors:
-                        if debtors[d] == 0:
-                            break
-                        if creditors[c] == 0:
-                            continue
-                        amt = round(min(debtors[d], creditors[c]), 2)
-                        if amt > 0:
-                            txns.append((d, c, amt))
-                            debtors[d] -= amt
-                            creditors[c] -= amt
-                return txns
-
-            transactions = optimize_settlements(balances)
+            transactions = settlement.settle(balances).transactions
             if transactions:
                 for frm, to, amt in transactions:
                     st.write(f"👉 `{frm}` owes `{to}` ₹{amt:.2f}")
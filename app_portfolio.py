@@ -0,0 +1,68 @@
+import streamlit as st
+import time
+
+import money
+import portfolio
+import trip_db
+
+st.set_page_config(page_title="Trip Portfolio", layout="wide")
+
+# --- Databases used by the trip pages ---
+DATABASES = {"Trips (db_1.py)": "Trips", "trip_splitter (app_8.py)": "trip_splitter"}
+
+st.title("🧳 Trip Portfolio")
+st.markdown("Net balances for the whole crew across every trip, settled in one go ✨")
+
+password = st.text_input("Enter password to view portfolio", type="password")
+
+if password == "mulki2024":
+    import pandas as pd
+
+    import settlement
+
+    db = trip_db.get_client(st.secrets["mongo"])[DATABASES[st.selectbox("Database", list(DATABASES))]]
+    trips = st.multiselect("Trips", portfolio.list_trips(db), default=portfolio.list_trips(db))
+    workers = st.slider("Parallel queries", min_value=1, max_value=32, value=portfolio.DEFAULT_WORKERS)
+
+    if trips:
+        started = time.perf_counter()
+        results = portfolio.fetch_summaries(db, trips, max_workers=workers)
+        wall_ms = 1000 * (time.perf_counter() - started)
+
+        # --- Per-trip Latency ---
+        st.subheader("⏱️ Per-trip Fetch Time")
+        st.caption(f"{len(results)} trips in {wall_ms:.0f} ms wall time "
+                   f"(sum of per-trip times {sum(r.latency_ms for r in results):.0f} ms)")
+        df_trips = pd.DataFrame([{
+            "Trip": r.trip,
+            "Expenses": r.summary["count"] if r.summary else None,
+            "Total (₹)": money.to_rupees(r.summary["total"]) if r.summary else None,
+            "Latency (ms)": round(r.latency_ms, 1),
+            "Error": r.error or "",
+        } for r in results]).sort_values("Latency (ms)", ascending=False)
+        st.dataframe(df_trips, hide_index=True)
+
+        # --- Cross-trip Balances ---
+        net = portfolio.merge_balances(results)
+        balances = {p: money.to_rupees(v) for p, v in sorted(net.items())}
+
+        if st.toggle("📋 Show Net Balances"):
+            for p, b in balances.items():
+                if b > 0:
+                    st.success(f"✅ {p}: +₹{b:.2f}")
+                elif b < 0:
+                    st.error(f"❌ {p}: -₹{-b:.2f}")
+                else:
+                    st.info(f"💤 {p}: Settled")
+
+        if st.toggle("🔁 Show Who Owes Whom"):
+            result = settlement.settle(balances)
+            st.caption(f"{len(result.transactions)} transfers via {result.algorithm} in {result.elapsed_ms:.1f} ms")
+            if result.transactions:
+                for frm, to, amt in result.transactions:
+                    st.write(f"👉 `{frm}` owes `{to}` ₹{amt:.2f}")
+            else:
+                st.success("Everyone is settled. No dues pending!")
+else:
+    if password:
+        st.error("Incorrect password ❌")
@@ -0,0 +1,147 @@
+import asyncio
+import threading
+import time
+from collections import namedtuple
+
+from pymongo import AsyncMongoClient
+
+import expense_cache
+import expense_views
+import trip_db
+import trip_summary
+
+# --- Async Data Access ---
+# Independent reads for a page (summary document, expense delta) are issued
+# together with asyncio.gather, so a page waits for
+# roughly the slowest query instead of the sum of all of them. They are only
+# issued when the trip version has moved since the last read in this process;
+# otherwise a page load costs the one find_one on the meta document.
+#
+# The expense delta carries only the fields of the views the page asks for
+# (see expense_views.py).
+#
+# Streamlit scripts are synchronous, so the async client lives on one event
+# loop running in a daemon thread and scripts call the blocking facade
+# (run / read_trip). The client is bound to that loop and shared by every
+# session in the process, like the sync client in trip_db.py.
+#
+# It is a second connection pool next to trip_db's. A page issues at most a
+# few reads at once, so it is kept small: async_max_pool_size in the mongo
+# secrets (default DEFAULT_MAX_POOL_SIZE); the other pool settings are shared.
+# Its usage is reported under "async" in trip_db.pool_stats().
+
+DEFAULT_MAX_POOL_SIZE = 10
+
+TripReads = namedtuple("TripReads", ["summary", "expenses", "categories", "version", "timings_ms", "wall_ms"])
+
+_lock = threading.Lock()
+_loop = None
+_client = None
+_client_key = None
+# Last reads per (trip collection, expense fields); only touched from the
+# event loop thread.
+_reads = {}
+
+
+def _get_loop():
+    global _loop
+    if _loop is not None:
+        return _loop
+    with _lock:
+        if _loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="async-db", daemon=True).start()
+            _loop = loop
+    return _loop
+
+
+def run(coro, timeout=None):
+    # Blocking call from a script thread; the coroutine runs on the shared loop.
+    return asyncio.run_coroutine_threadsafe(coro, _get_loop()).result(timeout)
+
+
+async def _new_client(uri, kwargs, stats):
+    # Created on the loop thread so the client's pool is bound to that loop.
+    return AsyncMongoClient(uri, event_listeners=[stats], **kwargs)
+
+
+def get_client(config):
+    global _client, _client_key
+    loop = _get_loop()
+    options = trip_db.pool_options(config)
+    options["max_pool_size"] = int(config.get("async_max_pool_size", DEFAULT_MAX_POOL_SIZE))
+    key = (config["uri"], tuple(sorted(options.items())))
+    if _client is not None and _client_key == key:
+        return _client
+    with _lock:
+        if _client is None or _client_key != key:
+            kwargs = {trip_db._CLIENT_KWARGS[k]: v for k, v in options.items()}
+            stats = trip_db.PoolStats()
+            client = asyncio.run_coroutine_threadsafe(_new_client(config["uri"], kwargs, stats), loop).result()
+            if _client is not None:
+                asyncio.run_coroutine_threadsafe(_client.close(), loop).result()
+            _client, _client_key = client, key
+            trip_db.track_pool("async", stats)
+    return _client
+
+
+def get_trip_collection(config, db_name, trip_name):
+    return get_client(config)[db_name][trip_name]
+
+
+async def _timed(name, timings, coro):
+    started = time.perf_counter()
+    try:
+        return await coro
+    finally:
+        timings[name] = round(1000 * (time.perf_counter() - started), 1)
+
+
+async def read_trip_async(collection, expenses=True, views=()):
+    # The returned summary and expense table may be shared; callers must not modify them.
+    timings = {}
+    started = time.perf_counter()
+    meta = await _timed("version", timings, collection.find_one({"_id": trip_summary.META_ID}, trip_summary.VERSION_FIELDS))
+    version = trip_summary.version_from_doc(meta)
+    key = (collection.full_name, expense_views.fields(*views))
+    cached = _reads.get(key)
+    if cached is not None and cached.version == version and (cached.expenses is not None or not expenses):
+        return cached._replace(timings_ms=timings, wall_ms=round(1000 * (time.perf_counter() - started), 1))
+    reads = [
+        _timed("summary", timings, collection.find_one({"_id": trip_summary.SUMMARY_ID})),
+    ]
+    if expenses:
+        reads.append(_timed("expenses", timings, expense_cache.fetch_expenses_async(collection, meta, views)))
+    results = await asyncio.gather(*reads)
+    wall_ms = round(1000 * (time.perf_counter() - started), 1)
+    summary = trip_summary.summary_from_doc(results[0])
+    trip_reads = TripReads(
+        summary,
+        results[1] if expenses else None,
+        # The summary document already totals every category there is.
+        sorted(c for c in summary["categories"] if c) if summary is not None else [],
+        version,
+        timings,
+        wall_ms,
+    )
+    # A trip with no summary document yet is read again next time.
+    if trip_reads.summary is not None:
+        _reads[key] = trip_reads
+    return trip_reads
+
+
+def read_trip(config, db_name, trip_name, expenses=True, views=()):
+    # A trip with no (paise) summary document yet comes back with summary None;
+    # callers build one through the sync path (trip_summary.get_summary).
+    # views picks the expense fields read (default: every field).
+    return run(read_trip_async(get_trip_collection(config, db_name, trip_name), expenses, views))
+
+
+def close():
+    global _client, _client_key
+    loop = _get_loop()
+    with _lock:
+        if _client is not None:
+            asyncio.run_coroutine_threadsafe(_client.close(), loop).result()
+        _client, _client_key = None, None
+        trip_db.track_pool("async", None)
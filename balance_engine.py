@@ -0,0 +1,121 @@
+from collections import defaultdict
+
+import numpy as np
+
+import money
+
+# --- Vectorized Balance Engine ---
+# Expenses are turned into arrays once:
+#   amounts   int64   (N,)    amount of each expense in paise
+#   payers    int32   (N,)    participant index of who paid
+#   included  bool    (N, P)  row i marks who shares expense i
+# after which paid, owed and net balances are a handful of integer array
+# operations. Shares follow money.split_paise exactly.
+
+
+class ParticipantIndex:
+    def __init__(self, names=()):
+        self.names = []
+        self.ids = {}
+        for name in names:
+            self.add(name)
+
+    def add(self, name):
+        if name not in self.ids:
+            self.ids[name] = len(self.names)
+            self.names.append(name)
+        return self.ids[name]
+
+    def __len__(self):
+        return len(self.names)
+
+
+class ExpenseMatrix:
+    def __init__(self, index, amounts, payers, included, categories=None, category_names=()):
+        self.index = index
+        self.amounts = amounts
+        self.payers = payers
+        self.included = included
+        self.categories = categories
+        self.category_names = list(category_names)
+
+    @classmethod
+    def from_expenses(cls, expenses, participants=(), split_key="included"):
+        index = ParticipantIndex(participants)
+        n = len(expenses)
+        amounts = np.fromiter((money.expense_paise(e) for e in expenses), dtype=np.int64, count=n)
+        payers = np.fromiter((index.add(e['paid_by']) for e in expenses), dtype=np.int32, count=n)
+        # Flatten every split list into (row, column) pairs and set them in one go.
+        sizes = np.fromiter((len(e[split_key]) for e in expenses), dtype=np.int64, count=n)
+        cols = np.fromiter((index.add(p) for e in expenses for p in e[split_key]), dtype=np.int32, count=int(sizes.sum()))
+        included = np.zeros((n, len(index)), dtype=bool)
+        included[np.repeat(np.arange(n), sizes), cols] = True
+
+        categories, category_names = None, ()
+        if n and 'category' in expenses[0]:
+            category_index = ParticipantIndex()
+            categories = np.fromiter((category_index.add(e['category']) for e in expenses), dtype=np.int32, count=n)
+            category_names = category_index.names
+        return cls(index, amounts, payers, included, categories, category_names)
+
+    def paid(self):
+        return self._sum_by(self.payers, len(self.index))
+
+    def owed(self):
+        counts = self.included.sum(axis=1)
+        base, remainder = np.divmod(self.amounts, counts)
+        owed = base @ self.included
+        # Leftover paise go to the first included names in sorted order:
+        # rank each included person within their row, in name order.
+        order = np.argsort(np.array(self.index.names, dtype=object), kind="stable")
+        ranked = self.included[:, order]
+        rank = np.cumsum(ranked, axis=1) - 1
+        extra = np.zeros_like(self.included)
+        extra[:, order] = ranked & (rank < remainder[:, None])
+        return owed + extra.sum(axis=0)
+
+    def net(self):
+        return self.paid() - self.owed()
+
+    def category_totals(self):
+        totals = self._sum_by(self.categories, len(self.category_names))
+        return dict(zip(self.category_names, totals.tolist()))
+
+    # np.bincount only sums floats; this keeps the sums in int64.
+    def _sum_by(self, ids, size):
+        totals = np.zeros(size, dtype=np.int64)
+        np.add.at(totals, ids, self.amounts)
+        return totals
+
+
+def compute_balances(expenses, participants, split_key="included"):
+    # Same {participant: rupees} dict the pages have always displayed.
+    if not expenses:
+        return {p: 0.0 for p in participants}
+    matrix = ExpenseMatrix.from_expenses(expenses, participants, split_key)
+    net = matrix.net()
+    return {p: money.to_rupees(int(net[matrix.index.ids[p]])) for p in participants}
+
+
+def category_totals(expenses):
+    if not expenses:
+        return {}
+    totals = ExpenseMatrix.from_expenses(expenses).category_totals()
+    return {c: money.to_rupees(v) for c, v in totals.items()}
+
+
+# Full summary in the shape (and paise) trip_summary.py uses, straight from raw expenses.
+def summarize(expenses, participants=()):
+    return summarize_matrix(ExpenseMatrix.from_expenses(expenses, participants))
+
+
+# Same, from a matrix built some other way (e.g. ExpenseTable.matrix).
+def summarize_matrix(matrix):
+    summary = {"total": 0, "count": len(matrix.amounts), "paid": defaultdict(int), "owed": defaultdict(int), "categories": defaultdict(int)}
+    if not summary["count"]:
+        return summary
+    summary["total"] = int(matrix.amounts.sum())
+    summary["paid"].update(zip(matrix.index.names, matrix.paid().tolist()))
+    summary["owed"].update(zip(matrix.index.names, matrix.owed().tolist()))
+    summary["categories"].update(matrix.category_totals())
+    return summary
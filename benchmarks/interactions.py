@@ -0,0 +1,127 @@
+import argparse
+import json
+import os
+import statistics
+import time
+from collections import defaultdict
+
+from benchmarks import synthetic
+
+# --- Interaction Benchmark ---
+# python -m benchmarks.interactions [page ...] [--expenses 2000] [--repeat 5] [--json]
+# Server time per widget interaction on the database pages, on an in-memory
+# mongomock trip of --expenses synthetic expenses:
+#   full_ms      re-running the whole script (what every interaction cost
+#                before the page was split into st.fragment sections)
+#   fragment_ms  running only the fragment that owns the widget (what it costs now)
+# AppTest always re-runs the whole script, so fragment time is taken by timing
+# each fragment body during those runs.
+
+DEFAULT_PAGES = ["db_1.py", "app_8.py"]
+SUMMARY_PASSWORD = "mulki2024"
+PARTICIPANTS = ["CR", "PALLE", "DOG", "NANI", "BABA", "VACHU", "GODA"]
+CATEGORIES = ["Food", "Fuel", "Stay", "Travel", "Activities", "Misc"]
+
+
+def _widget(elements, label):
+    return next(w for w in elements if w.label == label)
+
+
+# (interaction, fragment that owns the widget, how to perform it)
+INTERACTIONS = [
+    ("type description", "add_expense_form", lambda at, i: _widget(at.text_input, "Description").set_value(f"taxi {i}")),
+    ("switch paid by", "add_expense_form", lambda at, i: _widget(at.selectbox, "Paid By").set_value(PARTICIPANTS[i % len(PARTICIPANTS)])),
+    ("toggle net balances", "net_balances_panel", lambda at, i: _widget(at.toggle, "📋 Show Net Balances").set_value(i % 2 == 0)),
+    ("toggle who owes whom", "settlement_panel", lambda at, i: _widget(at.toggle, "🔁 Show Who Owes Whom").set_value(i % 2 == 0)),
+    ("toggle day-wise log", "day_log_panel", lambda at, i: _widget(at.toggle, "🗓️ Show Day-wise Expense Log").set_value(i % 2 == 0)),
+]
+
+_fragment_ms = defaultdict(list)
+
+
+def _timed_fragments():
+    # Wraps st.fragment so each fragment body's run time is recorded by name.
+    import functools
+
+    import streamlit as st
+
+    fragment = st.fragment
+
+    def timed(func=None, **kwargs):
+        if func is None:
+            return lambda f: timed(f, **kwargs)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kw):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kw)
+            finally:
+                _fragment_ms[func.__name__].append(1000 * (time.perf_counter() - started))
+
+        return fragment(wrapper, **kwargs)
+
+    st.fragment = timed
+
+
+def run(pages, expenses, repeat, seed):
+    from streamlit.testing.v1 import AppTest
+
+    from benchmarks import mock_db
+
+    client = mock_db.install()
+    _timed_fragments()
+    results = []
+    for page in pages:
+        app = AppTest.from_file(os.path.abspath(page), default_timeout=120)
+        app.secrets["mongo"] = {"uri": "mongodb://localhost"}
+        app.run()
+        trip = synthetic.generate_trip(expenses, days=28, seed=seed, names=PARTICIPANTS, category_names=CATEGORIES)
+        synthetic.load_trip(client[_db_name(page)][app.text_input[0].value], trip)
+        _widget(app.text_input, "Enter password to view history").set_value(SUMMARY_PASSWORD).run()
+        for name, fragment, act in INTERACTIONS:
+            full = []
+            for i in range(repeat):
+                _fragment_ms[fragment].clear()
+                act(app, i)
+                started = time.perf_counter()
+                app.run()
+                full.append(1000 * (time.perf_counter() - started))
+            results.append({
+                "page": page,
+                "interaction": name,
+                "fragment": fragment,
+                "full_ms": statistics.median(full),
+                "fragment_ms": statistics.median(_fragment_ms[fragment]),
+                "errors": [str(e.value) for e in app.exception],
+            })
+    return results
+
+
+def _db_name(page):
+    # Each database page names its database in a DB_NAME = "..." line.
+    with open(page, encoding="utf-8") as f:
+        for line in f:
+            if line.startswith("DB_NAME = "):
+                return line.split("=", 1)[1].strip().strip('"')
+    raise ValueError(f"{page} has no DB_NAME")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Server time per interaction, whole script vs. owning fragment")
+    parser.add_argument("pages", nargs="*", default=DEFAULT_PAGES)
+    parser.add_argument("--expenses", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    results = run(args.pages, args.expenses, args.repeat, args.seed)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"{'page':<10} {'interaction':<22} {'full ms':>8} {'fragment ms':>11} {'speed-up':>8}")
+        for r in results:
+            print(f"{r['page']:<10} {r['interaction']:<22} {r['full_ms']:>8.1f} {r['fragment_ms']:>11.1f}"
+                  f" {r['full_ms'] / r['fragment_ms'] if r['fragment_ms'] else float('inf'):>7.1f}x"
+                  + (f"  ERROR: {r['errors'][0]}" if r["errors"] else ""))
@@ -0,0 +1,74 @@
+import argparse
+import gc
+import json
+import tracemalloc
+
+from bson import ObjectId
+
+from benchmarks import synthetic
+
+# --- Memory per Expense ---
+# python -m benchmarks.memory [--expenses 100000] [--participants 7] [--json]
+# Bytes held per expense by each in-memory form of one synthetic trip:
+#   dicts      one dict per expense, as expense_cache used to keep them
+#   dataframe  pandas DataFrame of those dicts (the page's old full-trip copy)
+#   table      expense_table.ExpenseTable, what expense_cache keeps now
+# Measured with tracemalloc as the memory still allocated after building each
+# one (the input documents themselves are not counted), except the DataFrame:
+# its Arrow-backed string columns are invisible to tracemalloc, so pandas'
+# own deep memory_usage is reported for it.
+
+
+def _documents(expenses):
+    # What the cache used to hold: pymongo documents, normalized in place.
+    import money
+
+    docs = []
+    for e in expenses:
+        doc = dict(e, _id=ObjectId(), seq=len(docs) + 1)
+        # pymongo decodes a new string object per field of every document.
+        doc.update({k: "".join(v) for k, v in doc.items() if isinstance(v, str)})
+        doc["included"] = ["".join(p) for p in doc["included"]]
+        docs.append(money.normalize(doc))
+    return docs
+
+
+def _measure(build):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    held = build()
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return held, used
+
+
+def run(expenses, participants, seed):
+    import pandas as pd
+
+    import expense_table
+
+    trip = synthetic.generate_trip(expenses, participants, seed=seed)
+    docs, dict_bytes = _measure(lambda: _documents(trip))
+    frame_bytes = int(pd.DataFrame(docs).memory_usage(deep=True).sum())
+    _, table_bytes = _measure(lambda: expense_table.ExpenseTable.from_expenses(docs))
+    return [
+        {"form": form, "expenses": expenses, "bytes": used, "bytes_per_expense": round(used / expenses, 1)}
+        for form, used in (("dicts", dict_bytes), ("dataframe", frame_bytes), ("dicts + dataframe", dict_bytes + frame_bytes), ("table", table_bytes))
+    ]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Memory per expense: expense dicts, DataFrame and ExpenseTable")
+    parser.add_argument("--expenses", type=int, default=100000)
+    parser.add_argument("--participants", type=int, default=synthetic.DEFAULT_PARTICIPANTS)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    results = run(args.expenses, args.participants, args.seed)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for r in results:
+            print(f"{r['form']:<18} {r['bytes'] / 2**20:>8.1f} MiB {r['bytes_per_expense']:>8.1f} bytes/expense")
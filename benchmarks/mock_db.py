@@ -0,0 +1,61 @@
+import os
+import tempfile
+
+# --- In-memory Database for Benchmarks ---
+# install() points trip_db and async_db at one shared mongomock client and the
+# offline store at a throwaway file, so pages run with no server or state.
+
+
+# mongomock has no async API; this wraps its collections just enough for
+# async_db.read_trip (find_one, distinct, find().sort().to_list()).
+class _AsyncCursor:
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def sort(self, *args):
+        self._cursor = self._cursor.sort(*args)
+        return self
+
+    async def to_list(self, length=None):
+        return list(self._cursor)
+
+
+class _AsyncCollection:
+    def __init__(self, collection):
+        self._collection = collection
+        self.full_name = collection.full_name
+
+    async def find_one(self, *args, **kwargs):
+        return self._collection.find_one(*args, **kwargs)
+
+    async def distinct(self, *args, **kwargs):
+        return self._collection.distinct(*args, **kwargs)
+
+    def find(self, *args, **kwargs):
+        return _AsyncCursor(self._collection.find(*args, **kwargs))
+
+
+class _AsyncClient:
+    def __init__(self, client):
+        self._client = client
+
+    def __getitem__(self, db_name):
+        db = self._client[db_name]
+        return type("_AsyncDatabase", (), {"__getitem__": lambda _, name: _AsyncCollection(db[name])})()
+
+    async def close(self):
+        pass
+
+
+def install():
+    import mongomock
+
+    import async_db
+    import local_store
+    import trip_db
+
+    client = mongomock.MongoClient()
+    trip_db.MongoClient = lambda *args, **kwargs: client
+    async_db.AsyncMongoClient = lambda *args, **kwargs: _AsyncClient(client)
+    local_store.DEFAULT_PATH = os.path.join(tempfile.mkdtemp(prefix="trip-bench-"), "local.db")
+    return client
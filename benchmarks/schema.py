@@ -0,0 +1,89 @@
+import argparse
+import json
+
+import bson
+
+from benchmarks import synthetic
+
+# --- Document Size: schema v1 vs v2 ---
+# python -m benchmarks.schema [--expenses 10000] [--participants 7] [--description-words 0] [--mongo-uri URI] [--json]
+# Loads one synthetic trip twice, once per schema (v2 through
+# migrations.migrate_compact), and reports for each:
+#   bytes_per_doc   average BSON size of an expense document
+#   fetch_bytes     BSON bytes of every expense a full trip load reads
+#   page_bytes      the same for db_1.py's read: balances and categories
+#                   fields only (see expense_views.py)
+# With --mongo-uri (a local, otherwise idle mongod) also:
+#   wire_bytes      serverStatus network.bytesOut during that full load
+#   storage_bytes   collStats storageSize (compressed, on disk)
+#   page_docs_examined  documents the page read fetched (0: answered from
+#                   the covering index)
+# Without it the trips live in mongomock and only BSON sizes are reported.
+
+DB_NAME = "benchmarks"
+
+
+def _sizes(db, collection, mongo):
+    import expense_views
+    import trip_summary
+
+    docs = list(collection.find(trip_summary.EXPENSE_FILTER))
+    fetch_bytes = sum(len(bson.encode(d)) for d in docs)
+    row = {"docs": len(docs), "bytes_per_doc": round(fetch_bytes / len(docs), 1), "fetch_bytes": fetch_bytes}
+    fields = expense_views.fields("balances", "categories")
+    schema = trip_summary.schema_from_doc(collection.find_one({"_id": trip_summary.META_ID}))
+    row["page_bytes"] = sum(len(bson.encode(d)) for d in expense_views.find(collection, trip_summary.EXPENSE_FILTER, fields, schema))
+    if mongo:
+        before = db.command("serverStatus")["network"]["bytesOut"]
+        list(collection.find(trip_summary.EXPENSE_FILTER))
+        row["wire_bytes"] = db.command("serverStatus")["network"]["bytesOut"] - before
+        row["storage_bytes"] = db.command("collStats", collection.name)["storageSize"]
+        plan = collection.find(trip_summary.EXPENSE_FILTER, expense_views.projection(fields, schema)).sort("_id", 1).explain()
+        row["page_docs_examined"] = plan["executionStats"]["totalDocsExamined"]
+    return row
+
+
+def run(expenses, participants, seed, mongo_uri, description_words=0):
+    import migrations
+
+    if mongo_uri:
+        import trip_db
+
+        client = trip_db.get_client({"uri": mongo_uri})
+    else:
+        from benchmarks import mock_db
+
+        client = mock_db.install()
+    db = client[DB_NAME]
+    trip = synthetic.generate_trip(expenses, participants, seed=seed, description_words=description_words)
+    results = []
+    for schema in ("v1", "v2"):
+        collection = db[f"schema_{schema}_{expenses}"]
+        collection.drop()
+        synthetic.load_trip(collection, trip)
+        if schema == "v2":
+            migrations.migrate_compact(collection)
+        results.append(dict({"schema": schema, "expenses": expenses, "participants": participants}, **_sizes(db, collection, bool(mongo_uri))))
+        collection.drop()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bytes per expense document and per full trip load, schema v1 vs v2")
+    parser.add_argument("--expenses", type=int, default=10000)
+    parser.add_argument("--participants", type=int, default=synthetic.DEFAULT_PARTICIPANTS)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--description-words", type=int, default=0, help="give expenses descriptions of up to this many words")
+    parser.add_argument("--mongo-uri", help="local mongod for wire and storage numbers (default: mongomock, BSON sizes only)")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    results = run(args.expenses, args.participants, args.seed, args.mongo_uri, args.description_words)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for r in results:
+            extra = (f"  wire {r['wire_bytes'] / 1024:.0f} KiB  storage {r['storage_bytes'] / 1024:.0f} KiB"
+                     f"  page read examined {r['page_docs_examined']} docs") if "wire_bytes" in r else ""
+            print(f"{r['schema']}  {r['bytes_per_doc']:>7.1f} bytes/doc  full load {r['fetch_bytes'] / 1024:>8.0f} KiB"
+                  f"  page load {r['page_bytes'] / 1024:>8.0f} KiB{extra}")
@@ -0,0 +1,47 @@
+import argparse
+import random
+import statistics
+import time
+
+import settlement
+
+# --- Settlement Benchmark ---
+# python -m benchmarks.settlement [--people 7 12 20 60] [--trials 50]
+# Compares the original greedy optimize_settlements with settlement.settle()
+# on random balanced trips: transfers produced and time taken.
+
+
+def random_balances(people, rng):
+    # Amounts drawn from a few round figures so zero-sum subgroups actually occur.
+    values = [rng.choice([-1500, -1000, -500, -250, 250, 500, 1000, 1500]) + rng.choice([0, 0, 0.5, 0.25]) for _ in range(people - 1)]
+    values.append(-round(sum(values), 2))
+    return {f"P{i}": v for i, v in enumerate(values)}
+
+
+def run(people_counts, trials, seed):
+    rng = random.Random(seed)
+    print(f"{'people':>6} {'algorithm':<18} {'greedy txns':>11} {'solver txns':>11} {'greedy ms':>10} {'solver ms':>10}")
+    for people in people_counts:
+        greedy_txns, solver_txns, greedy_ms, solver_ms, algorithms = [], [], [], [], set()
+        for _ in range(trials):
+            balances = random_balances(people, rng)
+            started = time.perf_counter()
+            greedy_txns.append(len(settlement.greedy_settlements(balances)))
+            greedy_ms.append(1000 * (time.perf_counter() - started))
+            result = settlement.settle(balances)
+            solver_txns.append(len(result.transactions))
+            solver_ms.append(result.elapsed_ms)
+            algorithms.add(result.algorithm)
+        print(
+            f"{people:>6} {'/'.join(sorted(algorithms)):<18} {statistics.mean(greedy_txns):>11.2f} {statistics.mean(solver_txns):>11.2f}"
+            f" {statistics.median(greedy_ms):>10.3f} {statistics.median(solver_ms):>10.3f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Greedy vs minimal-transaction settlement")
+    parser.add_argument("--people", type=int, nargs="+", default=[7, 12, 16, 20, 60, 200])
+    parser.add_argument("--trials", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    run(args.people, args.trials, args.seed)
@@ -0,0 +1,95 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# --- Startup Benchmark ---
+# python -m benchmarks.startup [page ...] [--repeat 3] [--mongomock]
+# Each run is a fresh interpreter, so every number is a cold start:
+#   streamlit_ms   importing streamlit and its test harness
+#   first_render   first run of the page script (its own imports included)
+#   summary_render rerun after entering the summary password
+# plus which heavy libraries were loaded by the first render.
+
+DEFAULT_PAGES = ["app.py", "app_1.py", "app_2.py", "app_3.py", "app_4.py", "app_5.py", "app_6.py", "app_7.py", "app_8.py", "db_1.py"]
+HEAVY_MODULES = ["numpy", "pandas", "matplotlib", "pyarrow"]
+SUMMARY_PASSWORD = "mulki2024"
+
+
+def _child(page, use_mongomock):
+    started = time.perf_counter()
+    from streamlit.testing.v1 import AppTest
+
+    streamlit_ms = 1000 * (time.perf_counter() - started)
+
+    import trip_db
+
+    # Taken before mock_db.install(), which imports the page's data modules.
+    before = set(sys.modules)
+    config = {"uri": "mongodb://localhost"}
+    if use_mongomock:
+        from benchmarks import mock_db
+
+        mock_db.install()
+    else:
+        try:
+            config = trip_db.load_config()
+        except FileNotFoundError:
+            pass
+
+    app = AppTest.from_file(os.path.abspath(page), default_timeout=120)
+    app.secrets["mongo"] = config
+    started = time.perf_counter()
+    app.run()
+    first_render_ms = 1000 * (time.perf_counter() - started)
+    loaded = [m for m in HEAVY_MODULES if m in sys.modules and m not in before]
+
+    summary_ms = None
+    for box in app.text_input:
+        if "password" in box.label:
+            started = time.perf_counter()
+            box.set_value(SUMMARY_PASSWORD).run()
+            summary_ms = 1000 * (time.perf_counter() - started)
+    print(json.dumps({
+        "page": page,
+        "streamlit_ms": streamlit_ms,
+        "first_render_ms": first_render_ms,
+        "summary_render_ms": summary_ms,
+        "heavy_loaded_on_first_render": loaded,
+        "errors": [str(e.value) for e in app.exception],
+    }))
+
+
+def run(pages, repeat, use_mongomock):
+    print(f"{'page':<10} {'streamlit ms':>12} {'first render ms':>15} {'summary ms':>10}  heavy modules on first render")
+    for page in pages:
+        runs = []
+        for _ in range(repeat):
+            cmd = [sys.executable, "-m", "benchmarks.startup", "--child", page] + (["--mongomock"] if use_mongomock else [])
+            out = subprocess.run(cmd, capture_output=True, text=True, check=True).stdout
+            runs.append(json.loads(out.strip().splitlines()[-1]))
+        summary = [r["summary_render_ms"] for r in runs if r["summary_render_ms"] is not None]
+        errors = sorted({e for r in runs for e in r["errors"]})
+        print(
+            f"{page:<10} {statistics.median(r['streamlit_ms'] for r in runs):>12.0f}"
+            f" {statistics.median(r['first_render_ms'] for r in runs):>15.0f}"
+            f" {statistics.median(summary) if summary else float('nan'):>10.0f}"
+            f"  {', '.join(runs[-1]['heavy_loaded_on_first_render']) or '-'}"
+            + (f"  ERROR: {errors[0]}" if errors else "")
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cold-start import and first-render time per page")
+    parser.add_argument("pages", nargs="*", default=DEFAULT_PAGES)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--mongomock", action="store_true", help="serve the database pages from an in-memory mongomock client")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        _child(args.child, args.mongomock)
+    else:
+        run(args.pages, args.repeat, args.mongomock)
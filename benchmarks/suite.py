@@ -0,0 +1,210 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import time
+from datetime import datetime, timezone
+
+from benchmarks import synthetic
+
+# --- Benchmark Suite ---
+# python -m benchmarks.suite [--expenses 1000 10000] [--participants 7] [--exclusion-rate 0.2]
+#                            [--categories 6] [--days 10] [--repeat 5] [--mongo-uri URI] [--out-dir DIR]
+# python -m benchmarks.suite --compare OLD.json NEW.json
+#
+# Runs every case on a synthetic trip per size and writes one JSON file per
+# run (named after the time and git commit) so two commits can be compared.
+# Without --mongo-uri the database cases run against mongomock, which is only
+# good for comparing Python-side cost between commits, not for real latency.
+
+DEFAULT_SIZES = [1000, 10000]
+DEFAULT_OUT_DIR = os.path.join("benchmarks", "results")
+DB_NAME = "benchmarks"
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def _time(func, repeat, setup=None):
+    samples = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        started = time.perf_counter()
+        func()
+        samples.append(1000 * (time.perf_counter() - started))
+    samples.sort()
+    return {
+        "min_ms": round(samples[0], 3),
+        "median_ms": round(statistics.median(samples), 3),
+        "p95_ms": round(samples[min(len(samples) - 1, int(0.95 * len(samples)))], 3),
+        "repeat": repeat,
+    }
+
+
+# --- Cases ---
+# Each takes (collection, expenses, names) and returns {case name: (func, setup)}.
+def _fetch_cases(collection, expenses, names):
+    import expense_cache
+    import trip_summary
+
+    return {
+        "fetch_expenses.cold": (lambda: expense_cache.fetch_expenses(collection), lambda: expense_cache.invalidate(collection)),
+        "fetch_expenses.unchanged": (lambda: expense_cache.fetch_expenses(collection), None),
+        # Just the fields db_1.py's balances and category totals use (see expense_views.py).
+        "fetch_expenses.balances.cold": (lambda: expense_cache.fetch_expenses(collection, ("balances", "categories")), lambda: expense_cache.invalidate(collection)),
+        "summary.stored": (lambda: trip_summary.load_summary(collection), None),
+        "summary.checkpoint": (lambda: trip_summary.checkpoint_summary(collection), None),
+        "summary.python": (lambda: trip_summary.compute_summary(collection), None),
+        "summary.aggregation": (lambda: trip_summary.aggregate_summary(collection), None),
+    }
+
+
+def _balance_cases(collection, expenses, names):
+    import balance_engine
+    import expense_table
+    import trip_summary
+
+    summary = trip_summary.add_expenses(None, expenses)
+    table = expense_table.ExpenseTable.from_expenses(expenses)
+    return {
+        # What db_1.py does on every load: stored summary -> rupee balances.
+        "balances.from_summary": (lambda: trip_summary.summary_balances(summary, names), None),
+        "balances.python_loop": (lambda: trip_summary.add_expenses(None, expenses), None),
+        "balances.numpy": (lambda: balance_engine.summarize(expenses, names), None),
+        "balances.table": (lambda: balance_engine.summarize_matrix(table.matrix(names)), None),
+        "table.build": (lambda: expense_table.ExpenseTable.from_expenses(expenses), None),
+    }
+
+
+def _settlement_cases(collection, expenses, names):
+    import balance_engine
+    import settlement
+
+    balances = balance_engine.compute_balances(expenses, names)
+    return {
+        # greedy_settlements is the pages' original optimize_settlements.
+        "settlement.greedy": (lambda: settlement.greedy_settlements(balances), None),
+        "settlement.settle": (lambda: settlement.settle(balances), None),
+    }
+
+
+def _frame_cases(collection, expenses, names):
+    import pandas as pd
+
+    import day_log
+    import expense_table
+
+    by_date = sorted(expenses, key=lambda e: e["timestamp"])
+    table = expense_table.ExpenseTable.from_expenses(expenses)
+    days = [f"2024-01-{d:02d}" for d in range(1, 8)]
+    return {
+        "dataframe.expenses": (lambda: pd.DataFrame(expenses), None),
+        "day_log.group_by_day": (lambda: day_log.group_by_day(by_date), None),
+        "day_log.load_page": (lambda: day_log.load_page(collection), None),
+        "day_log.page_from_table": (lambda: day_log.page_from_table(table), None),
+        "day_log.dataframes": (lambda: [pd.DataFrame(d.rows) for d in day_log.group_by_day(by_date) if d.date in days], None),
+    }
+
+
+CASE_GROUPS = [_fetch_cases, _balance_cases, _settlement_cases, _frame_cases]
+
+
+def run(sizes, participants, exclusion_rate, categories, days, repeat, mongo_uri, seed):
+    import expense_cache
+    import money
+    import trip_summary
+
+    if mongo_uri:
+        import trip_db
+
+        client = trip_db.get_client({"uri": mongo_uri})
+    else:
+        from benchmarks import mock_db
+
+        client = mock_db.install()
+
+    results = []
+    for size in sizes:
+        collection = client[DB_NAME][f"synthetic_{size}_{participants}"]
+        collection.drop()
+        expense_cache.invalidate(collection)
+        trip = synthetic.generate_trip(size, participants, exclusion_rate, categories, days, seed)
+        synthetic.load_trip(collection, trip)
+        # As stored (with _id and seq), which is what the pages read back.
+        expenses = [money.normalize(e) for e in collection.find(trip_summary.EXPENSE_FILTER)]
+        names = synthetic.participant_names(participants)
+        for group in CASE_GROUPS:
+            for name, (func, setup) in group(collection, expenses, names).items():
+                try:
+                    timing = _time(func, repeat, setup)
+                except Exception as exc:
+                    # e.g. an aggregation stage mongomock does not implement
+                    timing = {"error": f"{type(exc).__name__}: {exc}"}
+                results.append(dict({"case": name, "expenses": size}, **timing))
+        collection.drop()
+    return results
+
+
+def compare(old_path, new_path):
+    with open(old_path, encoding="utf-8") as f:
+        old = json.load(f)
+    with open(new_path, encoding="utf-8") as f:
+        new = json.load(f)
+    before = {(r["case"], r["expenses"]): r for r in old["results"]}
+    print(f"{old['commit']} -> {new['commit']}")
+    print(f"{'case':<26} {'expenses':>8} {'old ms':>10} {'new ms':>10} {'change':>8}")
+    for r in new["results"]:
+        o = before.get((r["case"], r["expenses"]))
+        if not o or "median_ms" not in o or "median_ms" not in r:
+            continue
+        change = (r["median_ms"] - o["median_ms"]) / o["median_ms"] * 100 if o["median_ms"] else 0.0
+        print(f"{r['case']:<26} {r['expenses']:>8} {o['median_ms']:>10.2f} {r['median_ms']:>10.2f} {change:>+7.1f}%")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark suite on synthetic trips; writes JSON results")
+    parser.add_argument("--expenses", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--participants", type=int, default=synthetic.DEFAULT_PARTICIPANTS)
+    parser.add_argument("--exclusion-rate", type=float, default=synthetic.DEFAULT_EXCLUSION_RATE)
+    parser.add_argument("--categories", type=int, default=synthetic.DEFAULT_CATEGORIES)
+    parser.add_argument("--days", type=int, default=synthetic.DEFAULT_DAYS)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--mongo-uri", help="local mongod to run the database cases against (default: mongomock)")
+    parser.add_argument("--out-dir", default=DEFAULT_OUT_DIR)
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"))
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+    else:
+        commit = _git_commit()
+        results = run(args.expenses, args.participants, args.exclusion_rate, args.categories, args.days,
+                      args.repeat, args.mongo_uri, args.seed)
+        report = {
+            "commit": commit,
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "database": "mongod" if args.mongo_uri else "mongomock",
+            "params": {
+                "participants": args.participants, "exclusion_rate": args.exclusion_rate,
+                "categories": args.categories, "days": args.days, "repeat": args.repeat, "seed": args.seed,
+            },
+            "results": results,
+        }
+        os.makedirs(args.out_dir, exist_ok=True)
+        path = os.path.join(args.out_dir, f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{commit}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        for r in results:
+            timing = f"{r['median_ms']:>10.2f} ms" if "median_ms" in r else f"  {r['error']}"
+            print(f"{r['case']:<26} {r['expenses']:>8} {timing}")
+        print(f"results written to {path}")
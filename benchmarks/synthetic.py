@@ -0,0 +1,66 @@
+import random
+from datetime import date, timedelta
+
+import money
+
+# --- Synthetic Trips ---
+# Reproducible fake trips for the benchmarks: the same arguments and seed
+# always give the same expenses, in the same shape the pages write them.
+
+DEFAULT_PARTICIPANTS = 7
+DEFAULT_EXCLUSION_RATE = 0.2
+DEFAULT_CATEGORIES = 6
+DEFAULT_DAYS = 10
+START_DATE = date(2024, 1, 1)
+DESCRIPTION_WORDS = ["lunch", "dinner", "taxi", "hotel", "fuel", "snacks", "ferry", "tickets", "beach", "shack",
+                     "surf", "lessons", "water", "toll", "parking", "breakfast", "auto", "rental", "chai", "market"]
+
+
+def participant_names(count):
+    return [f"P{i:02d}" for i in range(count)]
+
+
+def generate_trip(
+    expenses,
+    participants=DEFAULT_PARTICIPANTS,
+    exclusion_rate=DEFAULT_EXCLUSION_RATE,
+    categories=DEFAULT_CATEGORIES,
+    days=DEFAULT_DAYS,
+    seed=0,
+    names=None,
+    category_names=None,
+    description_words=0,
+):
+    # exclusion_rate: chance that each person is left out of an expense's split
+    # (at least one person is always included). names / category_names replace
+    # the generated P00.. / "Category 0".. labels, e.g. to match a page's crew.
+    # description_words > 0 gives each expense a description of 1 to that many
+    # words; by default descriptions are empty (and the same seed gives the
+    # same trip as before the option existed).
+    rng = random.Random(seed)
+    names = names or participant_names(participants)
+    category_names = category_names or [f"Category {i}" for i in range(categories)]
+    dates = [(START_DATE + timedelta(days=d)).strftime("%Y-%m-%d") for d in range(days)]
+    trip = []
+    for _ in range(expenses):
+        included = [p for p in names if rng.random() >= exclusion_rate] or [rng.choice(names)]
+        trip.append({
+            "type": "expense",
+            "paid_by": rng.choice(names),
+            # Mostly small spends with the occasional big booking.
+            "amount_paise": money.stored_paise(round(rng.lognormvariate(6, 1), 2) or 1),
+            "description": " ".join(rng.choices(DESCRIPTION_WORDS, k=rng.randint(1, description_words))) if description_words else "",
+            "category": rng.choice(category_names),
+            "included": included,
+            "timestamp": rng.choice(dates),
+        })
+    return trip
+
+
+def load_trip(collection, expenses, batch_size=1000):
+    # Through the normal write path, so the summary, sequence numbers,
+    # checkpoints and trip version all match a real trip.
+    import trip_summary
+
+    for start in range(0, len(expenses), batch_size):
+        trip_summary.record_expenses(collection, [dict(e) for e in expenses[start:start + batch_size]])
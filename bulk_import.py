@@ -0,0 +1,264 @@
+import argparse
+import csv
+import io
+import json
+import time
+from collections import namedtuple
+from datetime import datetime
+
+from pymongo.errors import BulkWriteError
+
+import money
+import trip_summary
+
+# --- Bulk Expense Import ---
+# Rows are read one at a time from CSV, JSON Lines or a JSON array, checked,
+# and written in unordered insert_many batches through the summary write path.
+#
+# Expected columns / keys:
+#   paid_by, amount (rupees), description, category, timestamp (YYYY-MM-DD)
+#   included  names sharing the expense, separated by ";" (CSV) or a list (JSON)
+#   excluded  alternatively, names left out of an everyone-split
+# Missing included/excluded means the whole crew; missing timestamp means today.
+
+DEFAULT_BATCH_SIZE = 500
+FORMATS = ("csv", "jsonl", "json")
+
+ImportReport = namedtuple("ImportReport", ["inserted", "rejected", "batches", "elapsed_s"])
+
+
+def rows_per_second(report):
+    return report.inserted / report.elapsed_s if report.elapsed_s else 0.0
+
+
+def detect_format(filename):
+    name = filename.lower()
+    if name.endswith(".csv"):
+        return "csv"
+    if name.endswith((".jsonl", ".ndjson")):
+        return "jsonl"
+    return "json"
+
+
+# --- Streaming Readers ---
+# Each yields (line_or_item_number, row dict). A line that cannot be decoded
+# is yielded as a BadRow instead, which to_expense raises, so it is rejected
+# with its line number like any other bad row.
+class BadRow(ValueError):
+    pass
+
+
+def _iter_csv(stream):
+    reader = csv.DictReader(stream)
+    while True:
+        try:
+            row = next(reader)
+        except StopIteration:
+            return
+        except csv.Error as exc:
+            yield reader.line_num, BadRow(f"bad CSV: {exc}")
+            continue
+        yield reader.line_num, row
+
+
+def _iter_jsonl(stream):
+    for number, line in enumerate(stream, 1):
+        if line.strip():
+            try:
+                yield number, json.loads(line)
+            except json.JSONDecodeError as exc:
+                yield number, BadRow(f"bad JSON: {exc.msg}")
+
+
+# A top-level JSON array is decoded item by item from a sliding buffer, so a
+# large export never has to be held in memory as one parsed list.
+def _iter_json_array(stream, chunk_size=65536):
+    decoder = json.JSONDecoder()
+    buffer, pos, number, started = "", 0, 0, False
+    while True:
+        chunk = stream.read(chunk_size)
+        buffer = buffer[pos:] + chunk
+        pos = 0
+        while True:
+            while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+                pos += 1
+            if not started and pos < len(buffer):
+                if buffer[pos] != "[":
+                    raise ValueError("JSON import expects an array of expenses")
+                started, pos = True, pos + 1
+                continue
+            if pos < len(buffer) and buffer[pos] == "]":
+                return
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError as exc:
+                if not chunk:
+                    # Nothing after a broken item can be told apart, so it ends the array.
+                    yield number + 1, BadRow(f"bad JSON: {exc.msg}")
+                    return
+                break
+            number += 1
+            pos = end
+            yield number, item
+        if not chunk:
+            return
+
+
+def iter_rows(stream, fmt):
+    if fmt == "csv":
+        return _iter_csv(stream)
+    if fmt == "jsonl":
+        return _iter_jsonl(stream)
+    return _iter_json_array(stream)
+
+
+# --- Validation ---
+def parse_names(value):
+    if value is None or value == "":
+        return None
+    if isinstance(value, str):
+        return [v.strip() for v in value.split(";") if v.strip()]
+    if not isinstance(value, list) or not all(isinstance(v, str) for v in value):
+        raise ValueError(f"bad name list {value!r}")
+    return list(value)
+
+
+def _text(row, key):
+    value = row.get(key)
+    if value is None:
+        return ""
+    if not isinstance(value, str):
+        raise ValueError(f"{key} must be text, got {value!r}")
+    return value.strip()
+
+
+def row_names(row):
+    # Payer and sharers a row names, for callers collecting the crew from a
+    # file; raises ValueError for a row to_expense would reject as malformed.
+    if not isinstance(row, dict):
+        raise row if isinstance(row, BadRow) else ValueError("expected an object")
+    names = [_text(row, "paid_by")] + (parse_names(row.get("included")) or [])
+    return [p for p in names if p]
+
+
+def to_expense(row, participants, categories=None, defaults=None):
+    if isinstance(row, BadRow):
+        raise row
+    if not isinstance(row, dict):
+        raise ValueError(f"expected an object, got {row!r}")
+    paid_by = _text(row, "paid_by")
+    if paid_by not in participants:
+        raise ValueError(f"unknown payer {paid_by!r}")
+    try:
+        amount = money.stored_paise(row.get("amount"))
+    except Exception:
+        raise ValueError(f"bad amount {row.get('amount')!r}")
+    if amount <= 0:
+        raise ValueError("amount must be positive")
+    category = _text(row, "category")
+    if not category:
+        raise ValueError("missing category")
+    if categories is not None and category not in categories:
+        raise ValueError(f"unknown category {category!r}")
+
+    included = parse_names(row.get("included"))
+    excluded = parse_names(row.get("excluded")) or []
+    if included is None:
+        included = [p for p in participants if p not in excluded]
+    unknown = [p for p in included + excluded if p not in participants]
+    if unknown:
+        raise ValueError(f"unknown participants {', '.join(unknown)}")
+    if not included:
+        raise ValueError("nobody to split with")
+
+    timestamp = _text(row, "timestamp") or datetime.now().strftime("%Y-%m-%d")
+    try:
+        datetime.strptime(timestamp, "%Y-%m-%d")
+    except ValueError:
+        raise ValueError(f"bad date {timestamp!r}, expected YYYY-MM-DD")
+
+    expense = dict(defaults or {})
+    expense.update({
+        "paid_by": paid_by,
+        "amount_paise": amount,
+        "description": _text(row, "description"),
+        "category": category,
+        # Same order the form uses, whatever order the file listed them in.
+        "included": [p for p in participants if p in included],
+        "timestamp": timestamp,
+    })
+    return expense
+
+
+# --- Import ---
+def import_expenses(collection, rows, participants, categories=None, defaults=None, batch_size=DEFAULT_BATCH_SIZE, on_batch=None):
+    started = time.perf_counter()
+    inserted, rejected, batches, batch, numbers = 0, [], [], [], []
+
+    def flush():
+        nonlocal inserted
+        batch_started = time.perf_counter()
+        failed = {}
+        try:
+            trip_summary.record_expenses(collection, batch)
+        except BulkWriteError as exc:
+            failed = {err["index"]: err["errmsg"] for err in exc.details.get("writeErrors", [])}
+            rejected.extend((numbers[i], reason) for i, reason in sorted(failed.items()))
+        batches.append((len(batch), round(1000 * (time.perf_counter() - batch_started), 1)))
+        inserted += len(batch) - len(failed)
+        batch.clear()
+        numbers.clear()
+        if on_batch:
+            on_batch(inserted, len(rejected))
+
+    for number, row in rows:
+        try:
+            batch.append(to_expense(row, participants, categories, defaults))
+        except ValueError as exc:
+            rejected.append((number, str(exc)))
+            continue
+        numbers.append(number)
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    return ImportReport(inserted, rejected, batches, time.perf_counter() - started)
+
+
+def import_file(collection, binary_stream, fmt, participants, **kwargs):
+    text = io.TextIOWrapper(binary_stream, encoding="utf-8-sig", newline="")
+    try:
+        return import_expenses(collection, iter_rows(text, fmt), participants, **kwargs)
+    finally:
+        text.detach()
+
+
+# --- Command Line ---
+# python bulk_import.py <db_name> <trip_name> <file> [--format csv|jsonl|json] [--batch-size 500]
+if __name__ == "__main__":
+    import trip_db
+
+    parser = argparse.ArgumentParser(description="Bulk-load expenses into a trip")
+    parser.add_argument("db_name")
+    parser.add_argument("trip_name")
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=FORMATS)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--participants", default="CR,PALLE,DOG,NANI,BABA,VACHU,GODA")
+    parser.add_argument("--categories", help="comma-separated; if given, other categories are rejected")
+    parser.add_argument("--typed", action="store_true", help='tag rows with "type": "expense" (db_1.py trips)')
+    args = parser.parse_args()
+
+    collection = trip_db.get_trip_collection(trip_db.load_config(), args.db_name, args.trip_name)
+    with open(args.path, "rb") as f:
+        report = import_file(
+            collection, f, args.format or detect_format(args.path), args.participants.split(","),
+            categories=args.categories.split(",") if args.categories else None,
+            defaults={"type": "expense"} if args.typed else None,
+            batch_size=args.batch_size,
+        )
+    for i, (size, ms) in enumerate(report.batches, 1):
+        print(f"batch {i}: {size} rows in {ms:.1f} ms")
+    for number, reason in report.rejected:
+        print(f"rejected row {number}: {reason}")
+    print(f"{report.inserted} inserted, {len(report.rejected)} rejected in {report.elapsed_s:.2f}s ({rows_per_second(report):.0f} rows/s)")
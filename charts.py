@@ -0,0 +1,68 @@
+import io
+import threading
+from collections import OrderedDict
+
+# --- Chart Cache ---
+# Charts are rendered once per distinct input (e.g. a trip's or a day's
+# category totals) and the image bytes are kept in a process-wide LRU bounded
+# by total size. Figures are built with matplotlib's Figure class directly, so
+# nothing is ever registered with pyplot, and each is cleared after saving.
+
+MAX_CACHE_BYTES = 32 * 1024 * 1024
+DPI = 100
+
+_lock = threading.Lock()
+_cache = OrderedDict()
+_stats = {"hits": 0, "misses": 0, "evictions": 0, "bytes": 0}
+
+
+def _render_pie(items, fmt):
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=(6.4, 4.8), dpi=DPI)
+    try:
+        ax = fig.subplots()
+        ax.pie([v for _, v in items], labels=[k for k, _ in items], autopct="%1.1f%%", startangle=90)
+        ax.axis("equal")
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format=fmt)
+        return buffer.getvalue()
+    finally:
+        fig.clear()
+
+
+def _store(key, data):
+    _cache[key] = data
+    _stats["bytes"] += len(data)
+    while _stats["bytes"] > MAX_CACHE_BYTES and len(_cache) > 1:
+        _, evicted = _cache.popitem(last=False)
+        _stats["bytes"] -= len(evicted)
+        _stats["evictions"] += 1
+
+
+def pie_chart(totals, fmt="png"):
+    # totals: {label: amount}; identical totals give back the same bytes.
+    items = tuple((str(k), v) for k, v in totals.items() if v)
+    key = ("pie", fmt, items)
+    with _lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            _stats["hits"] += 1
+            return _cache[key]
+        _stats["misses"] += 1
+    data = _render_pie(items, fmt)
+    with _lock:
+        if key not in _cache:
+            _store(key, data)
+    return data
+
+
+def cache_stats():
+    with _lock:
+        return dict(_stats, entries=len(_cache), max_bytes=MAX_CACHE_BYTES)
+
+
+def clear():
+    with _lock:
+        _cache.clear()
+        _stats["bytes"] = 0
@@ -0,0 +1,110 @@
+import threading
+from collections import defaultdict, namedtuple
+from datetime import datetime
+
+import numpy as np
+
+import expense_schema
+import money
+import trip_summary
+
+# --- Day-wise Expense Log ---
+# The log is paged by date on the server: one small aggregation finds the
+# next few distinct dates after a cursor (keyset pagination), one find pulls
+# just those days sorted by date, and a single pass groups them.
+# page_from_table serves the same pages from a trip already held in memory.
+# Schema v2 documents keep their date in "t" (see expense_schema.py), so the
+# queries below match and group on either field.
+
+DEFAULT_DAYS_PER_PAGE = 7
+LOG_FIELDS = dict({"_id": 0, "timestamp": 1, "paid_by": 1, "amount": 1, "amount_paise": 1, "description": 1, "category": 1, "included": 1}, **expense_schema.V2_FIELDS)
+DAY = {"$ifNull": ["$timestamp", {"$dateToString": {"format": "%Y-%m-%d", "date": "$t"}}]}
+
+Day = namedtuple("Day", ["date", "rows", "total", "categories"])
+DayPage = namedtuple("DayPage", ["days", "next_after"])
+
+_indexed = set()
+_indexed_lock = threading.Lock()
+
+
+def ensure_index(collection):
+    key = collection.full_name
+    if key in _indexed:
+        return
+    with _indexed_lock:
+        if key not in _indexed:
+            collection.create_index([("timestamp", 1), ("_id", 1)])
+            collection.create_index([("t", 1), ("_id", 1)])
+            _indexed.add(key)
+
+
+def _date(day):
+    return datetime.strptime(day, expense_schema.DATE_FORMAT)
+
+
+def _page_dates(collection, after, days_per_page):
+    match = dict(trip_summary.EXPENSE_FILTER)
+    if after is not None:
+        match["$or"] = [{"timestamp": {"$gt": after}}, {"t": {"$gt": _date(after)}}]
+    pipeline = [
+        {"$match": match},
+        {"$group": {"_id": DAY}},
+        {"$sort": {"_id": 1}},
+        {"$limit": days_per_page + 1},
+    ]
+    return [row["_id"] for row in collection.aggregate(pipeline)]
+
+
+def group_by_day(expenses):
+    # Expenses must arrive sorted by timestamp; each day is closed off as soon
+    # as the date changes, so this is one pass with no per-date filtering.
+    days = []
+    for e in expenses:
+        if not days or e["timestamp"] != days[-1]["date"]:
+            days.append({"date": e["timestamp"], "rows": [], "total": 0, "categories": defaultdict(int)})
+        day = days[-1]
+        amount = money.expense_paise(e)
+        day["rows"].append({
+            "Paid By": e["paid_by"],
+            "Amount (₹)": money.to_rupees(amount),
+            "Description": e.get("description", ""),
+            "Category": e["category"],
+            "Split Among": ", ".join(e["included"]),
+        })
+        day["total"] += amount
+        day["categories"][e["category"]] += amount
+    return [Day(d["date"], d["rows"], d["total"], dict(d["categories"])) for d in days]
+
+
+def load_page(collection, after=None, days_per_page=DEFAULT_DAYS_PER_PAGE):
+    ensure_index(collection)
+    dates = _page_dates(collection, after, days_per_page)
+    next_after = dates[days_per_page - 1] if len(dates) > days_per_page else None
+    dates = dates[:days_per_page]
+    if not dates:
+        return DayPage([], None)
+    query = dict(trip_summary.EXPENSE_FILTER)
+    query["$or"] = [{"timestamp": {"$in": dates}}, {"t": {"$in": [_date(d) for d in dates]}}]
+    cursor = collection.find(query, LOG_FIELDS).sort("_id", 1)
+    # Sorted by date after decoding, as a trip part way through migration
+    # has its dates in two fields; the sort is stable, so _id order is kept.
+    expenses = sorted(map(trip_summary.expense_decoder(collection), cursor), key=lambda e: e["timestamp"])
+    return DayPage(group_by_day(expenses), next_after)
+
+
+def page_from_table(table, after=None, days_per_page=DEFAULT_DAYS_PER_PAGE):
+    # Same DayPage as load_page, from an ExpenseTable (see expense_table.py):
+    # rows for the page's dates are picked out of the days column and sorted
+    # by date, keeping table (i.e. _id) order within a day.
+    days = table.column("days", np.uint16)
+    dates = sorted(d for d in table.day_names.names if after is None or d > after)[:days_per_page + 1]
+    next_after = dates[days_per_page - 1] if len(dates) > days_per_page else None
+    dates = dates[:days_per_page]
+    if not dates:
+        return DayPage([], None)
+    rank = np.full(len(table.day_names), len(dates))
+    rank[[table.day_names.ids[d] for d in dates]] = np.arange(len(dates))
+    row_rank = rank[days]
+    rows = np.flatnonzero(row_rank < len(dates))
+    rows = rows[np.argsort(row_rank[rows], kind="stable")]
+    return DayPage(group_by_day(table.row(int(i)) for i in rows), next_after)
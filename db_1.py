@@ -1,72 +1,211 @@
 import streamlit as st
-from pymongo import MongoClient
-from collections import defaultdict
-import pandas as pd
-import matplotlib.pyplot as plt
 from datetime import datetime
+from pymongo.errors import PyMongoError
+
+import async_db
+import bulk_import
+import expense_cache
+import expense_table
+import local_store
+import metrics
+import money
+import trip_cache
+import trip_db
+import trip_summary
 
 st.set_page_config(page_title="Trip Splitter", layout="wide")
+# Timing spans for this rerun (see metrics.py); shown in the sidebar debug panel
+metrics.begin_run("db_1")
 
 # --- MongoDB Connection ---
-client = MongoClient(st.secrets["mongo"]["uri"])
-db = client["Trips"]
+# Shared pooled client, created once per server process (see trip_db.py)
+DB_NAME = "Trips"
 
 # --- Trip Selection ---
 st.title("🏄‍♂️ Trip Expense Splitter")
 trip_name = st.text_input("Enter Trip Name (e.g. Mulki)", value="Mulki")
-trip_collection = db[trip_name]
+trip_collection = trip_db.get_trip_collection(st.secrets["mongo"], DB_NAME, trip_name)
 
 # --- Participants & Default Categories ---
 participants = ["CR", "PALLE", "DOG", "NANI", "BABA", "VACHU", "GODA"]
 default_categories = ["Food", "Fuel", "Stay", "Travel", "Activities", "Misc"]
 
-# --- Load Expenses from DB ---
-def fetch_expenses():
-    return list(trip_collection.find({"type": "expense"}, {"_id": 0}))
+# --- Offline Store ---
+# New expenses land in a local SQLite outbox and are pushed to MongoDB in the
+# background; a local copy of the trip, kept by the same background thread,
+# is used when Atlas is unreachable. Only sessions that ask for the full copy
+# (descriptions included) have the thread fetch it
+mongo_config = st.secrets["mongo"]
+store = local_store.get_store()
+local_store.start_sync(store, lambda db_name, trip: trip_db.get_trip_collection(mongo_config, db_name, trip))
+if st.sidebar.toggle("📴 Keep an offline copy of this trip", key=f"offline_copy:{trip_name}"):
+    if store.watch(DB_NAME, trip_name):
+        local_store.request_sync(store)
+
+# --- Load Trip Data ---
+# Summary document, new expenses and categories are read concurrently (see async_db.py).
+# Expenses come with just the fields balances and category totals need (see
+# expense_views.py); the day log reads its own pages of days from the server when opened
+PAGE_VIEWS = ("balances", "categories")
+page_reads = None
+if not store.offline():
+    with metrics.span("page_reads") as span:
+        try:
+            page_reads = async_db.read_trip(mongo_config, DB_NAME, trip_name, views=PAGE_VIEWS)
+            span["docs"] = len(page_reads.expenses)
+        except PyMongoError:
+            store.mark_offline()
 
-expenses = fetch_expenses()
+with metrics.span("local_store") as span:
+    if page_reads is not None:
+        # Read after the server, so an expense pushed in between is missed for one
+        # rerun rather than counted twice
+        pending_expenses = store.expenses(DB_NAME, trip_name, [local_store.PENDING])
+        # Compact column store shared by every session (see expense_table.py)
+        trip_expenses = page_reads.expenses.with_rows(pending_expenses)
+        # Running totals kept up to date on every insert (see trip_summary.py)
+        summary = trip_summary.add_expenses(page_reads.summary or trip_summary.get_summary(trip_collection), pending_expenses)
+        # Every category used so far, including this device's unsent expenses
+        trip_categories = sorted(c for c in summary["categories"] if c)
+        # Derived data below is cached against this: the server's trip version plus
+        # whatever this device has not pushed yet
+        data_version = (page_reads.version, tuple(e["_id"] for e in pending_expenses))
+        span["docs"] = len(pending_expenses)
+    else:
+        local_expenses = store.expenses(DB_NAME, trip_name, [local_store.SYNCED, local_store.PENDING])
+        trip_expenses = expense_table.ExpenseTable.from_expenses(local_expenses)
+        trip_categories = sorted(trip_expenses.category_names.names)
+        summary = trip_summary.add_expenses(None, local_expenses)
+        data_version = None
+        span["docs"] = len(trip_expenses)
+
+# Cached per trip as a compact table; each load only pulls expenses added since the last one
+def fetch_expenses():
+    return trip_expenses
 
 # --- UI to Add Expense ---
 st.markdown("Welcome to the surf crew splitter. Add your expenses below and settle up later ✨")
-st.header("➕ Add New Expense")
-
-col1, col2 = st.columns(2)
-
-with col1:
-    paid_by = st.selectbox("Paid By", participants)
-    amount = st.number_input("Amount (₹)", min_value=0.0, step=100.0)
-    description = st.text_input("Description", placeholder="e.g. Hotel, Taxi")
-
-with col2:
-    all_categories = list({e['category'] for e in expenses}) + default_categories
-    all_categories = sorted(list(set(all_categories)))
-    category_selection = st.selectbox("Select Category", all_categories + ["Other (Type below)"])
-    custom_category = ""
-    if category_selection == "Other (Type below)":
-        custom_category = st.text_input("Custom Category", placeholder="e.g. Ice Cream, Cigarettes")
-        category = custom_category.strip()
-    else:
-        category = category_selection
 
-excluded_people = st.multiselect("Exclude people from split (optional)", participants, default=[])
+# Page sections run as fragments (st.fragment): a widget inside one only
+# reruns that section. Anything that changes the trip's data reruns the page.
+
+@st.fragment
+def add_expense_form():
+    st.header("➕ Add New Expense")
+
+    col1, col2 = st.columns(2)
+
+    with col1:
+        paid_by = st.selectbox("Paid By", participants)
+        amount = st.number_input("Amount (₹)", min_value=0.0, step=100.0)
+        description = st.text_input("Description", placeholder="e.g. Hotel, Taxi")
+
+    with col2:
+        all_categories = trip_categories + default_categories
+        all_categories = sorted(list(set(all_categories)))
+        category_selection = st.selectbox("Select Category", all_categories + ["Other (Type below)"])
+        custom_category = ""
+        if category_selection == "Other (Type below)":
+            custom_category = st.text_input("Custom Category", placeholder="e.g. Ice Cream, Cigarettes")
+            category = custom_category.strip()
+        else:
+            category = category_selection
 
-if st.button("Add Expense"):
-    if paid_by and amount > 0 and category:
+    excluded_people = st.multiselect("Exclude people from split (optional)", participants, default=[])
+
+    # Expenses added from this session, newest last, with their sync state shown below
+    my_expenses = st.session_state.setdefault(f"my_expenses:{trip_name}", [])
+    added = st.session_state.pop("added_message", None)
+    if added:
+        st.success(added)
+
+    if st.button("Add Expense"):
         included_people = [p for p in participants if p not in excluded_people]
-        expense = {
-            "type": "expense",
-            "paid_by": paid_by,
-            "amount": float(amount),
-            "description": description,
-            "category": category,
-            "included": included_people,
-            "timestamp": datetime.now().strftime("%Y-%m-%d")
-        }
-        trip_collection.insert_one(expense)
-        st.success(f"Added ₹{amount:.2f} by {paid_by} under {category}")
-        st.rerun()
-    else:
-        st.warning("Please enter all fields including category.")
+        if not included_people:
+            st.warning("Everyone is excluded: leave at least one person in the split.")
+        elif paid_by and amount > 0 and category:
+            expense = {
+                "type": "expense",
+                "paid_by": paid_by,
+                "amount_paise": money.stored_paise(amount),
+                "description": description,
+                "category": category,
+                "included": included_people,
+                "timestamp": datetime.now().strftime("%Y-%m-%d")
+            }
+            # Queued locally (shown as pending straight away); the sync thread commits it
+            expense_id = store.add_expense(DB_NAME, trip_name, expense)
+            local_store.request_sync(store)
+            my_expenses.append((expense_id, f"₹{amount:.2f} by {paid_by} for {description or category}"))
+            st.session_state["added_message"] = f"Added ₹{amount:.2f} by {paid_by} under {category}"
+            st.rerun()
+        else:
+            st.warning("Please enter all fields including category.")
+
+    sync_status = store.status(DB_NAME, trip_name)
+    if sync_status["offline"]:
+        st.warning(f"📴 Offline: showing this device's copy of the trip. {sync_status['pending']} expenses will sync when the connection is back.")
+    elif sync_status["pending"]:
+        st.caption(f"⏳ {sync_status['pending']} expenses waiting to sync")
+    if sync_status["failed"]:
+        st.error(f"❌ {sync_status['failed']} expenses could not be saved to the server")
+    if my_expenses:
+        with st.expander("🧾 Your recent expenses"):
+            states = store.states([expense_id for expense_id, _ in my_expenses[-10:]])
+            failed = []
+            for expense_id, label in reversed(my_expenses[-10:]):
+                state, error = states.get(expense_id, (None, None))
+                if state == local_store.SYNCED:
+                    st.write(f"✅ {label}: committed")
+                elif state == local_store.PENDING:
+                    st.write(f"⏳ {label}: pending")
+                elif state == local_store.FAILED:
+                    failed.append(expense_id)
+                    st.write(f"❌ {label}: failed ({error})")
+                elif state == local_store.CONFLICT:
+                    st.write(f"⚠️ {label}: conflicts with the server copy")
+            if failed and st.button("🔁 Retry failed"):
+                store.retry(failed)
+                local_store.request_sync(store)
+                st.rerun()
+
+    if sync_status["conflicts"]:
+        with st.expander(f"⚠️ {sync_status['conflicts']} expenses conflict with the server copy"):
+            st.json(store.conflicts(DB_NAME, trip_name))
+
+
+add_expense_form()
+
+# --- Bulk Import ---
+@st.fragment
+def bulk_import_panel():
+    with st.expander("📥 Import Expenses from CSV / JSON"):
+        st.caption("Columns: paid_by, amount, description, category, timestamp (YYYY-MM-DD), and optionally "
+                   "included or excluded (names separated by ';'). Rows default to the whole crew and today's date.")
+        uploaded = st.file_uploader("Expense file", type=["csv", "json", "jsonl"])
+        batch_size = st.number_input("Batch size", min_value=1, max_value=10000, value=bulk_import.DEFAULT_BATCH_SIZE, step=100)
+        if uploaded is not None and st.button("Import"):
+            progress = st.empty()
+            report = bulk_import.import_file(
+                trip_collection, uploaded, bulk_import.detect_format(uploaded.name), participants,
+                defaults={"type": "expense"}, batch_size=int(batch_size),
+                on_batch=lambda done, bad: progress.write(f"{done} imported, {bad} rejected so far..."),
+            )
+            # Kept for the page rerun that picks up the imported expenses
+            st.session_state["import_report"] = report
+            st.rerun()
+        report = st.session_state.pop("import_report", None)
+        if report is not None:
+            import pandas as pd
+
+            st.success(f"Imported {report.inserted} expenses in {report.elapsed_s:.2f}s "
+                       f"({bulk_import.rows_per_second(report):.0f} rows/s), {len(report.rejected)} rejected")
+            if report.rejected:
+                st.dataframe(pd.DataFrame(report.rejected, columns=["Row", "Reason"]), hide_index=True)
+            st.dataframe(pd.DataFrame(report.batches, columns=["Rows", "Milliseconds"]), hide_index=True)
+
+
+bulk_import_panel()
 
 # --- Logs & History Section ---
 st.markdown("---")
@@ -74,49 +213,63 @@ st.subheader("🔒 View Trip Summary (Protected)")
 password = st.text_input("Enter password to view history", type="password")
 
 if password == "mulki2024":
-    if expenses:
-        total = sum(e['amount'] for e in expenses)
-        person_spent = defaultdict(float)
-        category_spent = defaultdict(float)
-
-        for e in expenses:
-            person_spent[e['paid_by']] += e['amount']
-            category_spent[e['category']] += e['amount']
-
-        person_owes = defaultdict(float)
-        for e in expenses:
-            share = e['amount'] / len(e['included'])
-            for p in e['included']:
-                person_owes[p] += share
+    # Analytics, NumPy, pandas and plotting only load once the summary is opened
+    import tempfile
 
-        balances = {p: round(person_spent[p] - person_owes[p], 2) for p in participants}
+    import pandas as pd
 
-        st.subheader("💰 Total Trip Cost")
-        st.metric("Total", f"₹{total:.2f}")
+    import balance_engine
+    import charts
+    import day_log
+    import ledger_export
+    import settlement
 
-        st.subheader("📊 Category-wise Expense Breakdown")
-        if category_spent:
-            df_cat = pd.DataFrame(list(category_spent.items()), columns=["Category", "Amount"])
-            fig, ax = plt.subplots()
-            ax.pie(df_cat["Amount"], labels=df_cat["Category"], autopct="%1.1f%%", startangle=90)
-            ax.axis("equal")
-            st.pyplot(fig)
+    summary_source = st.radio(
+        "Summary source",
+        ["Stored summary", "Checkpoint + recent expenses", "Server-side aggregation", "Recompute from expenses"],
+        horizontal=True,
+    )
+    cache_key = trip_collection.full_name
+    with metrics.span("summary", source=summary_source):
+        if summary_source == "Checkpoint + recent expenses":
+            summary = trip_cache.get_or_compute(cache_key, data_version, "checkpoint_summary", lambda: trip_summary.checkpoint_summary(trip_collection))
+        elif summary_source == "Server-side aggregation":
+            summary = trip_cache.get_or_compute(cache_key, data_version, "aggregate_summary", lambda: trip_summary.aggregate_summary(trip_collection))
+        elif summary_source == "Recompute from expenses":
+            summary = trip_cache.get_or_compute(cache_key, data_version, "summarize", lambda: balance_engine.summarize_matrix(fetch_expenses().matrix(participants)))
 
+    @st.fragment
+    def day_log_panel():
         if st.toggle("🗓️ Show Day-wise Expense Log"):
-            df_exp = pd.DataFrame(expenses)
-            df_exp["amount"] = df_exp["amount"].astype(float)
-            for date in sorted(df_exp["timestamp"].unique()):
-                st.markdown(f"#### 📅 {date}")
-                df_day = df_exp[df_exp["timestamp"] == date]
-                for _, row in df_day.iterrows():
-                    st.write(f"💸 `{row['paid_by']}` paid ₹{row['amount']:.2f} for *{row['description']}* [{row['category']}] (Split among: {', '.join(row['included'])})")
-                # Day-wise pie chart
-                cat_day = df_day.groupby("category")["amount"].sum().reset_index()
-                fig_day, ax_day = plt.subplots()
-                ax_day.pie(cat_day["amount"], labels=cat_day["category"], autopct="%1.1f%%", startangle=90)
-                ax_day.axis("equal")
-                st.pyplot(fig_day)
+            # A page of days at a time, paged by date on the server and cached per trip
+            # version; offline, from this device's copy of the trip (see day_log.py)
+            log_pages = st.session_state.setdefault(f"day_log_pages:{trip_name}", [None])
+            after = log_pages[-1]
+            with metrics.span("day_log") as span:
+                if page_reads is not None:
+                    log_page = trip_cache.get_or_compute(cache_key, page_reads.version, ("day_log", after), lambda: day_log.load_page(trip_collection, after=after))
+                else:
+                    log_page = day_log.page_from_table(trip_expenses, after=after)
+                span["docs"] = sum(len(day.rows) for day in log_page.days)
+            for day in log_page.days:
+                with st.expander(f"📅 {day.date} — ₹{money.to_rupees(day.total):.2f} ({len(day.rows)} expenses)"):
+                    with metrics.span("dataframe", docs=len(day.rows)):
+                        day_frame = trip_cache.get_or_compute(cache_key, data_version, ("day_frame", day.date), lambda: pd.DataFrame(day.rows))
+                    st.dataframe(day_frame, hide_index=True)
+                    # Day-wise pie chart
+                    if st.checkbox("Show category chart", key=f"day_chart:{day.date}"):
+                        with metrics.span("chart"):
+                            st.image(charts.pie_chart(day.categories))
+            prev_col, next_col = st.columns(2)
+            if len(log_pages) > 1 and prev_col.button("⬅️ Earlier days"):
+                log_pages.pop()
+                st.rerun(scope="fragment")
+            if log_page.next_after is not None and next_col.button("Later days ➡️"):
+                log_pages.append(log_page.next_after)
+                st.rerun(scope="fragment")
 
+    @st.fragment
+    def net_balances_panel(balances):
         if st.toggle("📋 Show Net Balances"):
             for p, b in balances.items():
                 if b > 0:
@@ -126,32 +279,89 @@ if password == "mulki2024":
                 else:
                     st.info(f"💤 {p}: Settled")
 
+    @st.fragment
+    def settlement_panel(balances):
         if st.toggle("🔁 Show Who Owes Whom"):
-            def optimize_settlements(bal):
-                creditors = {k: v for k, v in bal.items() if v > 0}
-                debtors = {k: -v for k, v in bal.items() if v < 0}
-                txns = []
-                creditors = dict(sorted(creditors.items(), key=lambda x: -x[1]))
-                debtors = dict(sorted(debtors.items(), key=lambda x: -x[1]))
-                for d in debtors:
-                    for c in creditors:
-                        if debtors[d] == 0:
-                            break
-                        if creditors[c] == 0:
-                            continue
-                        amt = round(min(debtors[d], creditors[c]), 2)
-                        if amt > 0:
-                            txns.append((d, c, amt))
-                            debtors[d] -= amt
-                            creditors[c] -= amt
-                return txns
-
-            transactions = optimize_settlements(balances)
+            with metrics.span("settlement"):
+                result = trip_cache.get_or_compute(cache_key, data_version, ("settle", summary_source), lambda: settlement.settle(balances))
+            transactions = result.transactions
+            st.caption(f"{len(transactions)} transfers via {result.algorithm} in {result.elapsed_ms:.1f} ms")
             if transactions:
                 for frm, to, amt in transactions:
                     st.write(f"👉 `{frm}` owes `{to}` ₹{amt:.2f}")
             else:
                 st.success("Everyone is settled. No dues pending!")
+
+    @st.fragment
+    def export_panel():
+        with st.expander("📤 Export Ledger"):
+            export_format = st.selectbox("Format", ledger_export.FORMATS)
+            export_what = st.radio("Contents", ["Expenses", "Balances"], horizontal=True)
+            if st.button("Prepare Export"):
+                # Written to a temp file on disk, straight from the cursor, then read
+                # back once: download_button holds its one copy of the bytes, and the
+                # file is closed (and deleted) as soon as they are read
+                with tempfile.TemporaryFile() as export_file:
+                    with metrics.span("export", format=export_format) as span:
+                        if export_what == "Expenses":
+                            span["docs"] = ledger_export.export_ledger(trip_collection, export_file, export_format)
+                        else:
+                            ledger_export.export_balances(trip_collection, export_file, export_format, participants)
+                    export_file.seek(0)
+                    export_data = export_file.read()
+                st.download_button(
+                    f"⬇️ Download {export_what.lower()}",
+                    data=export_data,
+                    file_name=f"{trip_name}.{export_what.lower()}.{export_format}",
+                    mime=ledger_export.MIME_TYPES[export_format],
+                )
+
+    if summary["count"]:
+        total = money.to_rupees(summary["total"])
+        category_spent = {c: money.to_rupees(v) for c, v in summary["categories"].items()}
+        with metrics.span("balances"):
+            balances = trip_summary.summary_balances(summary, participants)
+
+        st.subheader("💰 Total Trip Cost")
+        st.metric("Total", f"₹{total:.2f}")
+
+        st.subheader("📊 Category-wise Expense Breakdown")
+        if category_spent:
+            # Rendered once per distinct set of totals, then served from cache
+            with metrics.span("chart"):
+                st.image(charts.pie_chart(summary["categories"]))
+
+        day_log_panel()
+        net_balances_panel(balances)
+        settlement_panel(balances)
+        export_panel()
+
+        if st.button("🛠️ Rebuild Summary from Expenses"):
+            trip_summary.rebuild_summary(trip_collection)
+            expense_cache.invalidate(trip_collection)
+            st.rerun()
+
+        with st.expander("🩺 Database Connection"):
+            st.json({
+                "health": trip_db.health_check(st.secrets["mongo"]),
+                "pool": trip_db.pool_stats(),
+                "expense_cache": expense_cache.cache_stats(trip_collection),
+                "trip_version": page_reads.version if page_reads else None,
+                "trip_cache": trip_cache.cache_stats(),
+                "page_reads_ms": dict(page_reads.timings_ms, wall=page_reads.wall_ms) if page_reads else None,
+                "local_store": store.status(DB_NAME, trip_name),
+                "chart_cache": charts.cache_stats(),
+            })
 else:
     if password:
         st.error("Incorrect password ❌")
+
+# --- Debug Panel (opt-in) ---
+page_run = metrics.end_run()
+if st.sidebar.toggle("🐞 Show timings"):
+    st.sidebar.caption(f"This rerun: {page_run.total_ms:.0f} ms" if page_run else "Last rerun was a fragment rerun")
+    if page_run:
+        st.sidebar.dataframe(page_run.spans, hide_index=True)
+    st.sidebar.caption("Per phase, this server process")
+    st.sidebar.dataframe(metrics.phase_stats(), hide_index=True)
+    st.sidebar.download_button("⬇️ Prometheus metrics", metrics.prometheus_text(), file_name="trip_splitter.prom", mime="text/plain")
@@ -0,0 +1,165 @@
+import threading
+import time
+
+import expense_schema
+import expense_views
+import trip_summary
+from expense_table import ExpenseTable
+from trip_summary import EXPENSE_FILTER
+
+# --- Process-wide Expense Cache ---
+# One entry per trip collection, shared by every session in this process.
+# Each rerun first reads the trip version (one find_one on the meta document):
+# if it has not moved there is nothing to fetch. If it has, only expenses with
+# a higher sequence number (trip_summary.py) than the highest one held are
+# asked for, unless existing documents were rewritten, in which case the trip
+# is loaded again from scratch.
+# Expenses are held in a compact ExpenseTable (see expense_table.py), decoded
+# from either document schema (see expense_schema.py).
+#
+# A trip has one entry per set of fields asked for (see expense_views.py):
+# a page that only shows balances holds, and fetches, just the fields those
+# need, and never the descriptions.
+
+# Sequence numbers are handed out by the server when an expense is written,
+# so one pushed late from the offline outbox, with an _id from long ago, is
+# fetched like any other. They are taken before the insert, though, so a
+# number below the highest held may still land: numbers not seen yet are
+# asked for again by the next fetches, for up to SEQ_GAP_TIMEOUT_S and at
+# most CHECKPOINT_EVERY numbers back (the slack checkpoints allow writers
+# too). After that the write is taken to have failed.
+SEQ_GAP_TIMEOUT_S = 30
+
+
+class _TripCache:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.table = ExpenseTable()
+        self.last_seq = None
+        self.gaps = {}
+        self.last_fetched = 0
+        self.version = None
+
+    def reset(self):
+        # A fresh table: the old one may still be held by callers.
+        self.table = ExpenseTable()
+        self.last_seq = None
+        self.gaps = {}
+
+
+_lock = threading.Lock()
+_caches = {}
+
+
+def _cache_for(collection, fields):
+    key = (collection.full_name, fields)
+    with _lock:
+        if key not in _caches:
+            _caches[key] = _TripCache()
+        return _caches[key]
+
+
+def _delta_query(cache):
+    if cache.last_seq is None:
+        return dict(EXPENSE_FILTER)
+    newer = [{"seq": {"$gt": cache.last_seq}}]
+    if cache.gaps:
+        newer.append({"seq": {"$in": sorted(cache.gaps)}})
+    return {"$and": [EXPENSE_FILTER, {"$or": newer}]}
+
+
+def _current(cache, version):
+    # True when the cached list already matches this trip version.
+    if cache.version is not None and version[1] != cache.version[1]:
+        cache.reset()
+    elif cache.version == version:
+        cache.last_fetched = 0
+        return True
+    return False
+
+
+def _held(cache, e):
+    # Expenses without seq predate sequence numbers and come with the first load.
+    if cache.last_seq is None:
+        return False
+    return "seq" not in e or (e["seq"] <= cache.last_seq and e["seq"] not in cache.gaps)
+
+
+def _absorb(cache, docs):
+    # Skips expenses a concurrent fetch of the same delta already added.
+    seqs, fetched = set(), 0
+    for e in docs:
+        if _held(cache, e) or e.get("seq") in seqs:
+            continue
+        cache.table.append(e)
+        fetched += 1
+        if "seq" in e:
+            seqs.add(e["seq"])
+    last_seq = max(seqs, default=cache.last_seq or 0)
+    floor = last_seq - trip_summary.CHECKPOINT_EVERY
+    now = time.monotonic()
+    for seq in range(max(cache.last_seq or 0, floor) + 1, last_seq + 1):
+        if seq not in seqs:
+            cache.gaps.setdefault(seq, now)
+    cache.gaps = {seq: seen for seq, seen in cache.gaps.items() if seq > floor and seq not in seqs and now - seen < SEQ_GAP_TIMEOUT_S}
+    cache.last_seq = max(last_seq, cache.last_seq or 0)
+    cache.last_fetched = fetched
+    return cache.table
+
+
+def fetch_expenses(collection, views=()):
+    # The expenses with the fields of views (default: every field). The
+    # returned table is shared between sessions; callers must not modify it
+    # (ExpenseTable.with_rows makes a copy with more rows).
+    fields = expense_views.fields(*views)
+    cache = _cache_for(collection, fields)
+    with cache.lock:
+        meta = collection.find_one({"_id": trip_summary.META_ID}, trip_summary.VERSION_FIELDS)
+        version = trip_summary.version_from_doc(meta)
+        if not _current(cache, version):
+            docs = expense_views.find(collection, _delta_query(cache), fields, trip_summary.schema_from_doc(meta))
+            _absorb(cache, map(trip_summary.expense_decoder(collection), docs))
+            cache.version = version
+        return cache.table
+
+
+async def fetch_expenses_async(collection, meta, views=()):
+    # Same cache, fed from an async collection (see async_db.py), with the meta
+    # document (VERSION_FIELDS) already read by the caller. The lock is not
+    # held across the await; a concurrent fetch of the same window is harmless
+    # because expenses already held are skipped.
+    fields = expense_views.fields(*views)
+    version = trip_summary.version_from_doc(meta)
+    cache = _cache_for(collection, fields)
+    with cache.lock:
+        if _current(cache, version):
+            return cache.table
+        query = _delta_query(cache)
+    docs = await expense_views.find_async(collection, query, fields, trip_summary.schema_from_doc(meta))
+    if any(expense_schema.is_v2(d) for d in docs):
+        # Read after the documents, so the roster covers everyone they name.
+        meta = await collection.find_one({"_id": trip_summary.META_ID}, trip_summary.ROSTER_FIELDS)
+        people = (meta or {}).get("people", [])
+        docs = [expense_schema.decode(d, people) for d in docs]
+    with cache.lock:
+        _absorb(cache, docs)
+        cache.version = version
+        return cache.table
+
+
+def invalidate(collection, views=None):
+    # Every entry for the trip, or only the one for views (() = every field).
+    fields = None if views is None else expense_views.fields(*views)
+    with _lock:
+        for key in [k for k in _caches if k[0] == collection.full_name and fields in (None, k[1])]:
+            del _caches[key]
+
+
+def cache_stats(collection):
+    # One entry per set of fields held for this trip.
+    with _lock:
+        caches = {key[1]: cache for key, cache in _caches.items() if key[0] == collection.full_name}
+    return {
+        ", ".join(fields): {"cached": len(cache.table), "fetched_last": cache.last_fetched, "last_seq": cache.last_seq, "seq_gaps": len(cache.gaps), "version": cache.version}
+        for fields, cache in caches.items()
+    }
@@ -0,0 +1,138 @@
+from datetime import datetime
+
+from bson.int64 import Int64
+
+import money
+
+# --- Expense Document Schemas ---
+# A trip stores its expenses in one of two layouts, chosen by "schema" in its
+# meta document (absent means v1; migrations.py converts a trip in place):
+#
+#   v1  {"type": "expense", "paid_by": "CR", "amount_paise": 12000, "description": "Lunch",
+#        "category": "Food", "included": ["CR", "PALLE", ...], "timestamp": "2024-01-05", "seq": 7}
+#   v2  {"p": 0, "a": 12000, "d": "Lunch", "c": "Food", "x": 128, "t": datetime(2024, 1, 5), "seq": 7}
+#
+# In v2, p and the bits of x index the trip's roster: the "people" list in the
+# meta document, which only ever grows. x is a bitmask of people left out,
+# plus one sentinel bit at n, the roster size when the expense was written:
+# people 0..n-1 share the expense unless their bit is set, and anyone who
+# joined the roster later does not. Everyone included is just 1 << n.
+# d is left out when empty and t is a BSON date. seq and _id keep their
+# names, as indexes and checkpoint queries rely on them.
+#
+# Above MASK_LIMIT people a trip's expenses list sharer ids in "i" instead,
+# which keeps x exact in the summary pipeline's double arithmetic.
+#
+# Readers accept both layouts: decode() turns a v2 document back into the
+# v1 shape, and v1_fields() does the same inside an aggregation pipeline.
+
+SCHEMA_V1 = 1
+SCHEMA_V2 = 2
+MASK_LIMIT = 52
+DATE_FORMAT = "%Y-%m-%d"
+
+# Projections: add these to a v1 projection to read the same data from v2.
+V2_FIELDS = {"p": 1, "a": 1, "d": 1, "c": 1, "x": 1, "i": 1, "t": 1}
+V2_SUMMARY_FIELDS = {"p": 1, "a": 1, "c": 1, "x": 1, "i": 1}
+
+_V1_ONLY = ("type", "paid_by", "amount", "amount_paise", "description", "category", "included", "timestamp")
+
+
+def is_v2(doc):
+    return "a" in doc
+
+
+def roster_size(doc):
+    # How many roster entries a v2 document refers to.
+    if "i" in doc:
+        return max(doc["i"] + [doc["p"]]) + 1
+    return max(int(doc["x"]).bit_length() - 1, doc["p"] + 1)
+
+
+def names_in(expenses):
+    names = {}
+    for e in expenses:
+        for p in e["included"]:
+            names.setdefault(p, None)
+        names.setdefault(e["paid_by"], None)
+    return list(names)
+
+
+def encode(e, people):
+    # v1 expense -> v2 document. people is {name: roster id} for the whole
+    # current roster, which must already hold every name in e.
+    doc = {"_id": e["_id"]} if "_id" in e else {}
+    doc["p"] = people[e["paid_by"]]
+    doc["a"] = Int64(money.expense_paise(e))
+    if e.get("description"):
+        doc["d"] = e["description"]
+    doc["c"] = e["category"]
+    included = {people[p] for p in e["included"]}
+    if len(people) <= MASK_LIMIT:
+        doc["x"] = sum(1 << i for i in range(len(people)) if i not in included) | 1 << len(people)
+    else:
+        doc["i"] = sorted(included)
+    if e.get("timestamp"):
+        doc["t"] = datetime.strptime(e["timestamp"], DATE_FORMAT)
+    # seq and anything else a writer added are kept as they are.
+    doc.update((k, v) for k, v in e.items() if k not in _V1_ONLY and k != "_id")
+    return doc
+
+
+def decode(doc, people):
+    # v2 document -> v1 expense (v1 documents are returned as they are). Only
+    # the fields present are converted, so projected reads work too.
+    if not is_v2(doc):
+        return doc
+    e = {k: v for k, v in doc.items() if k not in V2_FIELDS}
+    if "p" in doc:
+        e["paid_by"] = people[doc["p"]]
+    e["amount_paise"] = int(doc["a"])
+    e["description"] = doc.get("d", "")
+    if "c" in doc:
+        e["category"] = doc["c"]
+    if "i" in doc:
+        e["included"] = [people[i] for i in doc["i"]]
+    elif "x" in doc:
+        x = int(doc["x"])
+        e["included"] = [people[i] for i in range(x.bit_length() - 1) if not x >> i & 1]
+    if "t" in doc:
+        e["timestamp"] = doc["t"].strftime(DATE_FORMAT)
+    return e
+
+
+class Decoder:
+    # Decodes documents of either schema. The roster is loaded (load_people())
+    # on the first v2 document and again whenever one refers to someone the
+    # loaded roster does not have yet.
+    def __init__(self, load_people):
+        self._load_people = load_people
+        self.people = None
+
+    def __call__(self, doc):
+        if not is_v2(doc):
+            return doc
+        if self.people is None or roster_size(doc) > len(self.people):
+            self.people = self._load_people()
+        return decode(doc, self.people)
+
+
+def v1_fields(people):
+    # $project fields giving v1 and v2 documents alike paid_by, category and
+    # included (the amount is handled by trip_summary.AMOUNT_PAISE). people is
+    # the trip's roster, passed in as a literal.
+    roster = {"$literal": list(people)}
+    shifted = {"$floor": {"$divide": ["$x", {"$pow": [2, "$$id"]}]}}
+    by_id = {"$arrayElemAt": [roster, "$$id"]}
+    return {
+        "paid_by": {"$ifNull": ["$paid_by", {"$arrayElemAt": [roster, "$p"]}]},
+        "category": {"$ifNull": ["$category", "$c"]},
+        "included": {"$ifNull": [
+            "$included",
+            {"$map": {"input": "$i", "as": "id", "in": by_id}},
+            # Bit id of x is clear and below the sentinel bit.
+            {"$map": {"input": {"$filter": {"input": {"$range": [0, len(people)]}, "as": "id", "cond": {"$and": [
+                {"$gte": [shifted, 2]}, {"$eq": [{"$mod": [shifted, 2]}, 0]},
+            ]}}}, "as": "id", "in": by_id}},
+        ]},
+    }
@@ -0,0 +1,160 @@
+import sys
+from array import array
+
+from bson import ObjectId
+
+import money
+
+# --- Compact Expense Table ---
+# A trip's expenses kept column by column rather than as one dict (and one
+# list of name strings) per expense:
+#   ids           bytearray    12 bytes per expense, the raw ObjectId
+#   payers        array('H')   id into people
+#   masks         array('Q')   bit i set = people.names[i] shares the expense
+#   categories    array('H')   id into category_names
+#   days          array('H')   id into day_names (the YYYY-MM-DD timestamp)
+#   descriptions  list         interned strings
+#   amounts       array('q')   paise
+# Names, categories and dates are interned once per trip. Rows are turned
+# back into expense dicts only on demand (row(), iteration, slicing).
+# Expenses read for only some views (see expense_views.py) leave the other
+# columns blank: "" for names and text, no sharers.
+#
+# append() writes amounts last and len() reads amounts, so a reader on
+# another thread never sees a row whose other columns are missing.
+#
+# The table is filled on the page's expense-entry path, so NumPy (and
+# balance_engine) only load once a view asks for NumPy columns.
+
+MASK_BITS = 64
+
+
+class Interned:
+    # Same interning as balance_engine.ParticipantIndex, without importing NumPy.
+    def __init__(self, names=()):
+        self.names = []
+        self.ids = {}
+        for name in names:
+            self.add(name)
+
+    def add(self, name):
+        if name not in self.ids:
+            self.ids[name] = len(self.names)
+            self.names.append(name)
+        return self.ids[name]
+
+    def __len__(self):
+        return len(self.names)
+
+
+class ExpenseTable:
+    def __init__(self):
+        self.ids = bytearray()
+        self.payers = array("H")
+        self.masks = array("Q")
+        self.categories = array("H")
+        self.days = array("H")
+        self.descriptions = []
+        self.amounts = array("q")
+        self.people = Interned()
+        self.category_names = Interned()
+        self.day_names = Interned()
+
+    @classmethod
+    def from_expenses(cls, expenses):
+        table = cls()
+        table.extend(expenses)
+        return table
+
+    def __len__(self):
+        return len(self.amounts)
+
+    def append(self, e):
+        mask = 0
+        for p in e.get("included", ()):
+            mask |= 1 << self.people.add(p)
+        if mask >> MASK_BITS and isinstance(self.masks, array):
+            # More than 64 people on one trip: fall back to Python ints.
+            self.masks = list(self.masks)
+        self.ids += ObjectId(e["_id"]).binary
+        self.payers.append(self.people.add(e.get("paid_by", "")))
+        self.masks.append(mask)
+        self.categories.append(self.category_names.add(e.get("category", "")))
+        self.days.append(self.day_names.add(e.get("timestamp", "")))
+        self.descriptions.append(sys.intern(e.get("description") or ""))
+        self.amounts.append(money.expense_paise(e))
+
+    def extend(self, expenses):
+        for e in expenses:
+            self.append(e)
+
+    def with_rows(self, expenses):
+        # A copy with expenses added; this table may be shared and is left as is.
+        if not expenses:
+            return self
+        table = ExpenseTable()
+        n = len(self)
+        table.ids = self.ids[:12 * n]
+        for column in ("payers", "masks", "categories", "days", "descriptions", "amounts"):
+            setattr(table, column, getattr(self, column)[:n])
+        table.people = Interned(self.people.names)
+        table.category_names = Interned(self.category_names.names)
+        table.day_names = Interned(self.day_names.names)
+        table.extend(expenses)
+        return table
+
+    # --- Rows ---
+    def sharers(self, mask):
+        return [name for i, name in enumerate(self.people.names) if mask >> i & 1]
+
+    def row(self, i):
+        return {
+            "_id": ObjectId(bytes(self.ids[12 * i:12 * i + 12])),
+            "paid_by": self.people.names[self.payers[i]],
+            "amount_paise": self.amounts[i],
+            "amount": money.to_rupees(self.amounts[i]),
+            "description": self.descriptions[i],
+            "category": self.category_names.names[self.categories[i]],
+            # In first-seen order of the trip's people, not as originally listed.
+            "included": self.sharers(self.masks[i]),
+            "timestamp": self.day_names.names[self.days[i]],
+        }
+
+    def __iter__(self):
+        return (self.row(i) for i in range(len(self)))
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return [self.row(i) for i in range(*key.indices(len(self)))]
+        return self.row(range(len(self))[key])
+
+    # --- Views ---
+    def column(self, name, dtype, n=None):
+        # A NumPy copy of the first n (default len()) values. tobytes() rather
+        # than a buffer view, which would stop the array from growing.
+        import numpy as np
+
+        n = len(self) if n is None else n
+        return np.frombuffer(getattr(self, name).tobytes(), dtype=dtype)[:n]
+
+    def matrix(self, participants=()):
+        # balance_engine's ExpenseMatrix straight from the columns, with the
+        # given participants first in its index (as from_expenses does).
+        import numpy as np
+
+        from balance_engine import ExpenseMatrix, ParticipantIndex
+
+        n = len(self)
+        index = ParticipantIndex(participants)
+        remap = np.array([index.add(p) for p in self.people.names], dtype=np.int32)
+        payers = remap[self.column("payers", np.uint16, n)]
+        included = np.zeros((n, len(index)), dtype=bool)
+        if isinstance(self.masks, array):
+            masks = self.column("masks", np.uint64, n)
+            for bit, col in enumerate(remap):
+                included[:, col] = (masks >> np.uint64(bit)) & np.uint64(1)
+        else:
+            for row, mask in enumerate(self.masks[:n]):
+                included[row, remap[[bit for bit in range(len(remap)) if mask >> bit & 1]]] = True
+        categories = self.column("categories", np.uint16, n).astype(np.int32)
+        return ExpenseMatrix(index, self.column("amounts", np.int64, n), payers, included, categories, self.category_names.names)
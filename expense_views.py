@@ -0,0 +1,110 @@
+import threading
+
+import expense_schema
+
+# --- Per-view Expense Reads ---
+# Each reader of a trip's expenses declares the fields it uses, and expense
+# reads ask the server for just those, so e.g. balances never pull free-text
+# descriptions over the network:
+#   balances    paid_by, amount, included   net balances, who owes whom
+#   categories  category, amount            category totals
+# (The day log pages its own fields from the server, see day_log.py.)
+# A read for several views asks for the union of their fields; no views
+# means every field (the offline copy, exports).
+#
+# Field names differ by schema (see expense_schema.py). A projection uses the
+# trip's schema only, so on a v2 trip the balances and categories fields all
+# sit in COVERING_INDEX and those reads never touch the documents. Documents
+# such a projection misses (v1 documents in a trip part way through
+# migration, or sharers kept as "i" above MASK_LIMIT people) are read again
+# by _id with both schemas' fields.
+
+VIEWS = {
+    "balances": ("paid_by", "amount", "included"),
+    "categories": ("category", "amount"),
+}
+
+# Stored names of each field: (v1, v2).
+_STORED = {
+    "paid_by": (("paid_by",), ("p",)),
+    "amount": (("amount", "amount_paise"), ("a",)),
+    "included": (("included",), ("x",)),
+    "category": (("category",), ("c",)),
+    "description": (("description",), ("d",)),
+    "timestamp": (("timestamp",), ("t",)),
+}
+ALL_FIELDS = tuple(sorted(_STORED))
+
+# _id first: reads are sorted by it. type is there for EXPENSE_FILTER and seq
+# for delta reads (expense_cache.py). No array fields, so the index is not
+# multikey and can cover.
+COVERING_INDEX = [("_id", 1), ("type", 1), ("p", 1), ("a", 1), ("x", 1), ("c", 1), ("seq", 1)]
+
+_indexed = set()
+_indexed_lock = threading.Lock()
+
+
+def fields(*views):
+    # Sorted union of the views' fields; every read includes the amount.
+    if not views:
+        return ALL_FIELDS
+    return tuple(sorted({f for view in views for f in VIEWS[view]} | {"amount"}))
+
+
+def projection(fields, schema=expense_schema.SCHEMA_V1):
+    # Plus seq, which expense_cache.py fetches deltas by.
+    v2 = schema == expense_schema.SCHEMA_V2
+    return dict({name: 1 for f in fields for name in _STORED[f][v2]}, seq=1)
+
+
+def _fallback_projection(fields):
+    both = dict(projection(fields), **projection(fields, expense_schema.SCHEMA_V2))
+    if "included" in fields:
+        both["i"] = 1
+    return both
+
+
+def _incomplete(docs, fields):
+    # _ids of documents the projection came back without an amount (or
+    # without sharers) for: stored under the other schema's names, or as "i".
+    missing = []
+    for d in docs:
+        if not ("a" in d or "amount_paise" in d or "amount" in d):
+            missing.append(d["_id"])
+        elif "included" in fields and not ("included" in d or "x" in d or "i" in d):
+            missing.append(d["_id"])
+    return missing
+
+
+def _merge(docs, reread):
+    by_id = {d["_id"]: d for d in reread}
+    return [by_id.get(d["_id"], d) for d in docs]
+
+
+def find(collection, query, fields, schema=expense_schema.SCHEMA_V1):
+    # Raw documents (not decoded) matching query, sorted by _id.
+    docs = list(collection.find(query, projection(fields, schema)).sort("_id", 1))
+    missing = _incomplete(docs, fields)
+    if missing:
+        docs = _merge(docs, collection.find({"_id": {"$in": missing}}, _fallback_projection(fields)))
+    return docs
+
+
+async def find_async(collection, query, fields, schema=expense_schema.SCHEMA_V1):
+    # find() on an async collection (see async_db.py).
+    docs = await collection.find(query, projection(fields, schema)).sort("_id", 1).to_list(None)
+    missing = _incomplete(docs, fields)
+    if missing:
+        docs = _merge(docs, await collection.find({"_id": {"$in": missing}}, _fallback_projection(fields)).to_list(None))
+    return docs
+
+
+def ensure_indexes(collection):
+    # Only for v2 trips: on v1 documents every key would be null.
+    key = collection.full_name
+    if key in _indexed:
+        return
+    with _indexed_lock:
+        if key not in _indexed:
+            collection.create_index(COVERING_INDEX, name="expense_views_covering_seq")
+            _indexed.add(key)
@@ -0,0 +1,176 @@
+import argparse
+import json
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import balance_engine
+import bulk_import
+import money
+import settlement
+
+# --- Headless Ledger ---
+# Balances and settlements for whole trips without a Streamlit session: the
+# same math the pages use (balance_engine, settlement), on expenses read from
+# a MongoDB trip collection or a CSV / JSON / JSON Lines file.
+#
+# python ledger.py --db Trips [trip ...] [--mongo-uri URI] [--workers N]
+# python ledger.py trips/*.csv [--participants "CR;PALLE;..."] [--workers N]
+#
+# Trips are settled in a process pool, one trip per task, so hundreds of
+# trips use every core; per-trip results and overall throughput are printed.
+
+DEFAULT_WORKERS = os.cpu_count() or 1
+
+TripLedger = namedtuple("TripLedger", ["trip", "expenses", "total_paise", "balances", "settlement", "rejected", "elapsed_ms", "error"])
+
+
+def participants_of(expenses, split_key="included"):
+    # Payers and sharers in first-seen order; stored trips do not record the crew.
+    names = {}
+    for e in expenses:
+        names.setdefault(e["paid_by"], None)
+        for p in e[split_key]:
+            names.setdefault(p, None)
+    return list(names)
+
+
+def settle_trip(trip, expenses, participants=None, split_key="included", rejected=()):
+    started = time.perf_counter()
+    participants = list(participants or participants_of(expenses, split_key))
+    balances = balance_engine.compute_balances(expenses, participants, split_key)
+    return TripLedger(
+        trip,
+        len(expenses),
+        sum(money.expense_paise(e) for e in expenses),
+        balances,
+        settlement.settle(balances),
+        list(rejected),
+        1000 * (time.perf_counter() - started),
+        None,
+    )
+
+
+# --- Sources ---
+def load_collection(collection):
+    import expense_schema
+    import trip_summary
+
+    projection = dict({"_id": 0, "paid_by": 1, "amount": 1, "amount_paise": 1, "included": 1}, **expense_schema.V2_SUMMARY_FIELDS)
+    return list(map(trip_summary.expense_decoder(collection), collection.find(trip_summary.EXPENSE_FILTER, projection)))
+
+
+def load_file(path, participants=None):
+    # Returns (expenses, participants, rejected). Without a crew list, everyone
+    # named as a payer or sharer in the file is taken to be on the trip.
+    with open(path, encoding="utf-8", newline="") as f:
+        rows = list(bulk_import.iter_rows(f, bulk_import.detect_format(path)))
+    if participants is None:
+        names = {}
+        for _, row in rows:
+            try:
+                for p in bulk_import.row_names(row):
+                    names.setdefault(p, None)
+            except ValueError:
+                # Rejected with its line number below.
+                pass
+        participants = list(names)
+    expenses, rejected = [], []
+    for number, row in rows:
+        try:
+            expenses.append(bulk_import.to_expense(row, participants))
+        except ValueError as exc:
+            rejected.append((number, str(exc)))
+    return expenses, participants, rejected
+
+
+# --- Batch Settlement ---
+# A job is ("mongo", config, db_name, trip) or ("file", path, participants).
+def _job_name(job):
+    return job[3] if job[0] == "mongo" else os.path.basename(job[1])
+
+
+def _run(job):
+    started = time.perf_counter()
+    try:
+        if job[0] == "mongo":
+            import trip_db
+
+            _, config, db_name, trip = job
+            expenses = load_collection(trip_db.get_trip_collection(config, db_name, trip))
+            result = settle_trip(trip, expenses)
+        else:
+            _, path, participants = job
+            expenses, participants, rejected = load_file(path, participants)
+            result = settle_trip(_job_name(job), expenses, participants, rejected=rejected)
+        # Loading included, so the per-trip time matches what a caller waits for.
+        return result._replace(elapsed_ms=1000 * (time.perf_counter() - started))
+    except Exception as exc:
+        return TripLedger(_job_name(job), 0, 0, {}, None, [], 1000 * (time.perf_counter() - started), f"{type(exc).__name__}: {exc}")
+
+
+def settle_many(jobs, workers=DEFAULT_WORKERS):
+    # Yields TripLedger results in job order. workers <= 1 runs in this process.
+    if workers <= 1:
+        yield from map(_run, jobs)
+        return
+    # spawn rather than fork: a MongoClient must not be carried across a fork.
+    with ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn")) as pool:
+        yield from pool.map(_run, jobs, chunksize=max(1, len(jobs) // (workers * 4)))
+
+
+def to_json(result):
+    data = result._asdict()
+    data["settlement"] = result.settlement._asdict() if result.settlement else None
+    return data
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compute balances and settlements for many trips in a process pool")
+    parser.add_argument("trips", nargs="*", help="trip collections (with --db) or CSV / JSON / JSON Lines files")
+    parser.add_argument("--db", help="MongoDB database to read trips from; all of its trips if none are named")
+    parser.add_argument("--mongo-uri", help="defaults to the uri in .streamlit/secrets.toml")
+    parser.add_argument("--participants", help="crew for file trips, separated by ';' (default: everyone named in the file)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--settlements", action="store_true", help="also print who pays whom")
+    parser.add_argument("--json", action="store_true", help="print one JSON object per trip")
+    args = parser.parse_args()
+
+    if args.db:
+        import portfolio
+        import trip_db
+
+        config = {"uri": args.mongo_uri} if args.mongo_uri else trip_db.load_config()
+        trips = args.trips or portfolio.list_trips(trip_db.get_client(config)[args.db])
+        jobs = [("mongo", config, args.db, trip) for trip in trips]
+    else:
+        if not args.trips:
+            parser.error("name some ledger files, or --db to read trips from MongoDB")
+        crew = bulk_import.parse_names(args.participants)
+        jobs = [("file", path, crew) for path in args.trips]
+
+    started = time.perf_counter()
+    settled = failed = expenses = 0
+    for r in settle_many(jobs, args.workers):
+        if args.json:
+            print(json.dumps(to_json(r)))
+        elif r.error:
+            print(f"{r.trip:<30} ERROR: {r.error}")
+        else:
+            print(f"{r.trip:<30} {r.expenses:>7} expenses  ₹{money.to_rupees(r.total_paise):>12,.2f}"
+                  f"  {len(r.settlement.transactions):>3} transfers ({r.settlement.algorithm})  {r.elapsed_ms:>8.1f} ms"
+                  + (f"  {len(r.rejected)} rows rejected" if r.rejected else ""))
+            if args.settlements:
+                for debtor, creditor, amount in r.settlement.transactions:
+                    print(f"    {debtor} pays {creditor} ₹{amount:,.2f}")
+        failed += bool(r.error)
+        settled += not r.error
+        expenses += r.expenses
+    elapsed = time.perf_counter() - started
+    if args.json:
+        print(json.dumps({"trips": settled, "failed": failed, "expenses": expenses, "workers": args.workers, "elapsed_s": round(elapsed, 3)}))
+    else:
+        print(f"{settled} trips settled, {failed} failed, {expenses} expenses in {elapsed:.2f}s with {args.workers} workers"
+              f" ({settled / elapsed:.1f} trips/s, {expenses / elapsed:,.0f} expenses/s)")
@@ -0,0 +1,141 @@
+import argparse
+import csv
+import io
+import json
+import os
+import time
+
+import money
+import trip_summary
+
+# --- Streaming Ledger Export ---
+# Expenses are read from the cursor batch by batch and written out as they
+# arrive, so memory use does not grow with the size of the trip.
+
+FORMATS = ("csv", "jsonl", "parquet")
+MIME_TYPES = {"csv": "text/csv", "jsonl": "application/x-ndjson", "parquet": "application/vnd.apache.parquet"}
+DEFAULT_BATCH_SIZE = 1000
+
+LEDGER_COLUMNS = ["id", "timestamp", "paid_by", "amount", "amount_paise", "category", "description", "included"]
+BALANCE_COLUMNS = ["participant", "paid", "owed", "net"]
+# Parquet column types (pyarrow type names); every other column is a string.
+# One fixed schema for every batch, rather than whatever each batch's values
+# would infer (e.g. null for a batch with no descriptions).
+PARQUET_TYPES = {"amount": "float64", "amount_paise": "int64", "paid": "float64", "owed": "float64", "net": "float64", "included": "list<string>"}
+
+
+def _ledger_rows(collection, batch_size):
+    projection = {"type": 0}
+    cursor = collection.find(trip_summary.EXPENSE_FILTER, projection).sort("_id", 1).batch_size(batch_size)
+    for e in map(trip_summary.expense_decoder(collection), cursor):
+        money.normalize(e)
+        yield {
+            "id": str(e["_id"]),
+            "timestamp": e.get("timestamp", ""),
+            "paid_by": e["paid_by"],
+            "amount": e["amount"],
+            "amount_paise": e["amount_paise"],
+            "category": e.get("category", ""),
+            "description": e.get("description", ""),
+            "included": list(e.get("included", [])),
+        }
+
+
+def _balance_rows(collection, participants):
+    summary = trip_summary.get_summary(collection)
+    for p in participants or sorted(set(summary["paid"]) | set(summary["owed"])):
+        yield {
+            "participant": p,
+            "paid": money.to_rupees(summary["paid"][p]),
+            "owed": money.to_rupees(summary["owed"][p]),
+            "net": money.to_rupees(summary["paid"][p] - summary["owed"][p]),
+        }
+
+
+# --- Writers ---
+# Each takes an iterator of row dicts and a binary file object.
+def _write_csv(rows, columns, out):
+    text = io.TextIOWrapper(out, encoding="utf-8", newline="")
+    writer = csv.DictWriter(text, fieldnames=columns)
+    writer.writeheader()
+    count = 0
+    for row in rows:
+        if "included" in row:
+            row = dict(row, included=";".join(row["included"]))
+        writer.writerow(row)
+        count += 1
+    text.flush()
+    text.detach()
+    return count
+
+
+def _write_jsonl(rows, columns, out):
+    count = 0
+    for row in rows:
+        out.write(json.dumps(row, ensure_ascii=False).encode("utf-8") + b"\n")
+        count += 1
+    return count
+
+
+def _write_parquet(rows, columns, out, batch_size=DEFAULT_BATCH_SIZE):
+    # Optional dependency: only needed for Parquet output.
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    types = {"float64": pa.float64(), "int64": pa.int64(), "string": pa.string(), "list<string>": pa.list_(pa.string())}
+    schema = pa.schema([(c, types[PARQUET_TYPES.get(c, "string")]) for c in columns])
+    # Opened up front, so a trip with no expenses still gets a readable (empty) file.
+    writer, batch, count = pq.ParquetWriter(out, schema), [], 0
+
+    def flush():
+        writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+        batch.clear()
+
+    for row in rows:
+        batch.append(row)
+        count += 1
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    writer.close()
+    return count
+
+
+_WRITERS = {"csv": _write_csv, "jsonl": _write_jsonl, "parquet": _write_parquet}
+
+
+def export_ledger(collection, out, fmt, batch_size=DEFAULT_BATCH_SIZE):
+    if fmt == "parquet":
+        return _write_parquet(_ledger_rows(collection, batch_size), LEDGER_COLUMNS, out, batch_size)
+    return _WRITERS[fmt](_ledger_rows(collection, batch_size), LEDGER_COLUMNS, out)
+
+
+def export_balances(collection, out, fmt, participants=None):
+    return _WRITERS[fmt](_balance_rows(collection, participants), BALANCE_COLUMNS, out)
+
+
+# --- Command Line ---
+# python ledger_export.py <db_name> [<trip_name> ...] [--format csv|jsonl|parquet] [--out-dir exports]
+# With no trip names every collection in the database is exported. Each trip
+# gets <trip>.ledger.<ext> and <trip>.balances.<ext>.
+if __name__ == "__main__":
+    import trip_db
+
+    parser = argparse.ArgumentParser(description="Export trip ledgers and balances")
+    parser.add_argument("db_name")
+    parser.add_argument("trips", nargs="*")
+    parser.add_argument("--format", choices=FORMATS, default="csv")
+    parser.add_argument("--out-dir", default="exports")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    db = trip_db.get_client(trip_db.load_config())[args.db_name]
+    os.makedirs(args.out_dir, exist_ok=True)
+    for trip_name in args.trips or sorted(db.list_collection_names()):
+        started = time.perf_counter()
+        with open(os.path.join(args.out_dir, f"{trip_name}.ledger.{args.format}"), "wb") as f:
+            rows = export_ledger(db[trip_name], f, args.format, args.batch_size)
+        with open(os.path.join(args.out_dir, f"{trip_name}.balances.{args.format}"), "wb") as f:
+            export_balances(db[trip_name], f, args.format)
+        print(f"{trip_name}: {rows} expenses in {time.perf_counter() - started:.2f}s")
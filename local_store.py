@@ -0,0 +1,483 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from bson import ObjectId
+from bson.int64 import Int64
+from pymongo.errors import BulkWriteError, ConfigurationError, ConnectionFailure, PyMongoError
+
+import money
+import trip_summary
+
+# --- Offline-first Local Store ---
+# Every expense is written to a local SQLite database (WAL mode) first and
+# read back from it, so adding and viewing expenses works at local-disk speed
+# with no network. Expenses bound for MongoDB also get an outbox row; a
+# background thread pushes the outbox in batches whenever Atlas is reachable.
+#
+# Sync is idempotent: the _id is chosen locally, and the server side is an
+# upsert that leaves existing documents alone (trip_summary.upsert_expenses),
+# so a batch can be resent after a dropped connection. If a document with
+# the same _id is already on the server with different contents, the expense
+# is marked as a conflict and both versions are kept for a person to resolve.
+#
+# Each expense is pending until the server has it, then synced (committed).
+# Network errors are retried with backoff for as long as it takes; any other
+# error is retried a few times before the expense is marked failed, after
+# which only an explicit retry puts it back in the queue. Such errors are
+# charged only to the expenses the server refused (its per-document write
+# errors, or by splitting the batch until the bad rows are found), and the
+# rest of the outbox keeps going.
+#
+# The offline copy of a trip is kept by the same background thread: pages
+# watch() a trip, and every pass copies in whatever expenses the server has
+# that the store does not. That copy is the one reader needing every field,
+# descriptions included, so it is kept only for trips a user asked for (pages
+# keep calling watch() while they want it) and only while they do: a trip not
+# asked for in WATCH_TTL_S, or pushed out by MAX_WATCHED more recent ones, stops
+# being mirrored and its all-fields table in expense_cache is released.
+#
+# A trip is addressed by (db_name, trip). db_name "" is a local-only trip
+# (the session-only pages) and never goes to the outbox.
+
+DEFAULT_PATH = os.path.join(".trip_splitter", "local.db")
+DEFAULT_SYNC_BATCH = 200
+SYNC_INTERVAL_S = 15
+# Backoff between sync passes after an error: 1, 2, 4, ... seconds, capped.
+RETRY_BASE_S = 1
+MAX_BACKOFF_S = 60
+# Non-network errors before an expense is given up on.
+MAX_ATTEMPTS = 5
+# After a failed push the store reports itself offline for this long, so pages
+# skip the network instead of waiting out a server-selection timeout.
+OFFLINE_GRACE_S = 30
+
+# Errors that mean the server cannot be reached, as opposed to ones it
+# returned. ConfigurationError is what a mongodb+srv:// URI gives with no DNS.
+NETWORK_ERRORS = (ConnectionFailure, ConfigurationError)
+
+WATCH_TTL_S = 600
+MAX_WATCHED = 8
+
+# Fields that must match for a server copy to count as the same expense.
+SYNC_FIELDS = ("paid_by", "amount_paise", "description", "category", "included", "timestamp")
+
+PENDING, SYNCED, CONFLICT, FAILED = "pending", "synced", "conflict", "failed"
+
+SyncReport = namedtuple("SyncReport", ["pushed", "already_synced", "conflicts", "rejected", "batches", "error", "elapsed_s"])
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS expenses (
+    id TEXT PRIMARY KEY,
+    db_name TEXT NOT NULL,
+    trip TEXT NOT NULL,
+    doc TEXT NOT NULL,
+    state TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS expenses_by_trip ON expenses (db_name, trip, created_at);
+CREATE TABLE IF NOT EXISTS outbox (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    expense_id TEXT NOT NULL UNIQUE,
+    db_name TEXT NOT NULL,
+    trip TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT
+);
+CREATE TABLE IF NOT EXISTS conflicts (
+    expense_id TEXT PRIMARY KEY,
+    db_name TEXT NOT NULL,
+    trip TEXT NOT NULL,
+    local TEXT NOT NULL,
+    remote TEXT NOT NULL,
+    detected_at REAL NOT NULL
+);
+"""
+
+
+def _dumps(expense):
+    return json.dumps({k: (int(v) if k == "amount_paise" else v) for k, v in expense.items() if k != "_id"}, ensure_ascii=False)
+
+
+def _loads(row_id, doc):
+    e = json.loads(doc)
+    e["_id"] = row_id
+    return money.normalize(e)
+
+
+def _same(local, remote):
+    local, remote = money.normalize(dict(local)), money.normalize(dict(remote))
+    # Sharers compare as a set: trips on schema v2 list them in roster order.
+    for e in (local, remote):
+        e["included"] = sorted(e.get("included", []))
+    return all(local.get(f) == remote.get(f) for f in SYNC_FIELDS)
+
+
+class LocalStore:
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._sync_lock = threading.Lock()
+        self._mirrored = {}
+        # (db_name, trip) -> when a page last asked, oldest first
+        self._watched = OrderedDict()
+        self._unwatched = []
+        self._watch_lock = threading.Lock()
+        self.last_sync = None
+        self.last_failure = None
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SCHEMA)
+
+    # One connection per thread; WAL lets the sync thread write while pages read.
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    # --- Local Reads & Writes ---
+    def add_expense(self, db_name, trip, expense):
+        # Expenses bound for the server must be countable (ValueError if not).
+        if db_name:
+            trip_summary.check_expenses([expense])
+        expense_id = str(expense.get("_id") or ObjectId())
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT INTO expenses (id, db_name, trip, doc, state, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (expense_id, db_name, trip, _dumps(expense), PENDING if db_name else SYNCED, time.time()),
+            )
+            if db_name:
+                conn.execute("INSERT INTO outbox (expense_id, db_name, trip) VALUES (?, ?, ?)", (expense_id, db_name, trip))
+        return expense_id
+
+    def expenses(self, db_name, trip, states=None):
+        query = "SELECT id, doc FROM expenses WHERE db_name = ? AND trip = ?"
+        params = [db_name, trip]
+        if states is not None:
+            query += f" AND state IN ({', '.join('?' * len(states))})"
+            params.extend(states)
+        rows = self._conn().execute(query + " ORDER BY created_at, id", params)
+        return [_loads(row_id, doc) for row_id, doc in rows]
+
+    def clear(self, db_name, trip):
+        with self._conn() as conn:
+            conn.execute("DELETE FROM outbox WHERE db_name = ? AND trip = ?", (db_name, trip))
+            conn.execute("DELETE FROM conflicts WHERE db_name = ? AND trip = ?", (db_name, trip))
+            conn.execute("DELETE FROM expenses WHERE db_name = ? AND trip = ?", (db_name, trip))
+
+    # Copies expenses read from the server into the local store, so the trip
+    # can still be shown when offline. The table handed over by expense_cache
+    # only grows, so only its new tail is written each time (a fresh table
+    # after expense_cache.invalidate starts over).
+    def mirror(self, db_name, trip, remote_expenses):
+        key = (db_name, trip)
+        seen_list, start = self._mirrored.get(key, (None, 0))
+        if seen_list != id(remote_expenses):
+            start = 0
+        if start >= len(remote_expenses):
+            return 0
+        now = time.time()
+        with self._conn() as conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO expenses (id, db_name, trip, doc, state, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                [(str(e["_id"]), db_name, trip, _dumps(e), SYNCED, now) for e in remote_expenses[start:]],
+            )
+        self._mirrored[key] = (id(remote_expenses), len(remote_expenses))
+        return len(remote_expenses) - start
+
+    def watch(self, db_name, trip):
+        # Keep an offline copy of this trip for the next WATCH_TTL_S. True when
+        # it was not being kept, so the caller can ask for a sync pass
+        # (request_sync) straight away.
+        key = (db_name, trip)
+        with self._watch_lock:
+            first = key not in self._watched
+            self._watched[key] = time.time()
+            self._watched.move_to_end(key)
+            while len(self._watched) > MAX_WATCHED:
+                self._unwatched.append(self._watched.popitem(last=False)[0])
+        return first
+
+    def _expire_watches(self):
+        # (trips to mirror, trips no longer mirrored since the last call)
+        with self._watch_lock:
+            cutoff = time.time() - WATCH_TTL_S
+            for key in [key for key, asked in self._watched.items() if asked < cutoff]:
+                del self._watched[key]
+                self._unwatched.append(key)
+            unwatched, self._unwatched = self._unwatched, []
+            return list(self._watched), unwatched
+
+    def refresh_mirrors(self, get_collection):
+        # Mirrors every watched trip from the server, through the process-wide
+        # expense cache (so an unchanged trip costs one find_one). Returns the
+        # first error, or None.
+        import expense_cache
+
+        watched, unwatched = self._expire_watches()
+        for db_name, trip in unwatched:
+            if (db_name, trip) not in self._watched:
+                self._mirrored.pop((db_name, trip), None)
+                expense_cache.invalidate(get_collection(db_name, trip), views=())
+        for db_name, trip in watched:
+            try:
+                self.mirror(db_name, trip, expense_cache.fetch_expenses(get_collection(db_name, trip)))
+            except PyMongoError as exc:
+                if isinstance(exc, NETWORK_ERRORS):
+                    self.mark_offline()
+                return str(exc)
+        return None
+
+    def status(self, db_name=None, trip=None):
+        where, params = "", []
+        if db_name is not None:
+            where, params = " WHERE db_name = ? AND trip = ?", [db_name, trip]
+        counts = dict(self._conn().execute(f"SELECT state, COUNT(*) FROM expenses{where} GROUP BY state", params))
+        return {
+            "pending": counts.get(PENDING, 0),
+            "synced": counts.get(SYNCED, 0),
+            "conflicts": counts.get(CONFLICT, 0),
+            "failed": counts.get(FAILED, 0),
+            "offline": self.offline(),
+            "last_sync": self.last_sync,
+        }
+
+    def conflicts(self, db_name, trip):
+        rows = self._conn().execute(
+            "SELECT expense_id, local, remote, detected_at FROM conflicts WHERE db_name = ? AND trip = ? ORDER BY detected_at",
+            (db_name, trip),
+        )
+        return [{"id": i, "local": json.loads(l), "remote": json.loads(r), "detected_at": t} for i, l, r, t in rows]
+
+    def states(self, expense_ids):
+        # {expense_id: (state, last error or None)} for the ids that exist.
+        if not expense_ids:
+            return {}
+        marks = ", ".join("?" * len(expense_ids))
+        rows = self._conn().execute(
+            f"SELECT e.id, e.state, o.last_error FROM expenses e LEFT JOIN outbox o ON o.expense_id = e.id WHERE e.id IN ({marks})",
+            list(expense_ids),
+        )
+        return {i: (state, error) for i, state, error in rows}
+
+    def retry(self, expense_ids):
+        with self._conn() as conn:
+            conn.executemany(
+                "UPDATE expenses SET state = ? WHERE id = ? AND state = ?", [(PENDING, i, FAILED) for i in expense_ids]
+            )
+            conn.executemany("UPDATE outbox SET attempts = 0 WHERE expense_id = ?", [(i,) for i in expense_ids])
+
+    def mark_offline(self):
+        self.last_failure = time.time()
+
+    def offline(self):
+        return self.last_failure is not None and time.time() - self.last_failure < OFFLINE_GRACE_S
+
+    # --- Sync ---
+    def _push(self, collection, rows):
+        # rows: [(expense_id, doc json)] for one trip. Returns (pushed,
+        # already_synced, conflicts, rejected), rejected being {expense_id:
+        # error} for rows the server refused. Network errors are raised.
+        try:
+            return self._push_batch(collection, rows) + ({},)
+        except NETWORK_ERRORS:
+            raise
+        except BulkWriteError as exc:
+            bad = {
+                str(err["op"]["q"]["_id"]): err.get("errmsg", str(exc))
+                for err in exc.details.get("writeErrors", [])
+                if "q" in err.get("op", {})
+            }
+            landed = len(exc.details.get("upserted", []))
+            error = exc
+        except (PyMongoError, ValueError) as exc:
+            # ValueError: an expense the summary cannot count (trip_summary.check_expenses).
+            bad, landed, error = {}, 0, exc
+        if not bad:
+            # No per-document errors to go by: halve the batch until they show.
+            if len(rows) == 1:
+                return 0, 0, 0, {rows[0][0]: str(error)}
+            half = len(rows) // 2
+            first, second = self._push(collection, rows[:half]), self._push(collection, rows[half:])
+            return first[0] + second[0], first[1] + second[1], first[2] + second[2], dict(first[3], **second[3])
+        # The rest went in (and were counted) before the error; sending them
+        # again finds them on the server and settles their state.
+        rest = [row for row in rows if row[0] not in bad]
+        pushed, already, conflicts, rejected = self._push(collection, rest) if rest else (0, 0, 0, {})
+        return pushed + landed, already - landed, conflicts, dict(rejected, **bad)
+
+    def _push_batch(self, collection, rows):
+        docs = {row_id: _loads(row_id, doc) for row_id, doc in rows}
+        outgoing = []
+        for row_id, e in docs.items():
+            e = dict(e, _id=ObjectId(row_id), amount_paise=Int64(e["amount_paise"]))
+            e.pop("amount", None)
+            outgoing.append(e)
+        inserted = {str(_id) for _id in trip_summary.upsert_expenses(collection, outgoing)}
+        remote = {}
+        if len(inserted) < len(docs):
+            others = [ObjectId(i) for i in docs if i not in inserted]
+            decode = trip_summary.expense_decoder(collection)
+            remote = {str(d["_id"]): decode(d) for d in collection.find({"_id": {"$in": others}})}
+        synced, conflicted = [], []
+        for row_id, e in docs.items():
+            if row_id in inserted or _same(e, remote.get(row_id, e)):
+                synced.append(row_id)
+            else:
+                conflicted.append(row_id)
+        now = time.time()
+        with self._conn() as conn:
+            conn.executemany("UPDATE expenses SET state = ? WHERE id = ?", [(SYNCED, i) for i in synced])
+            conn.executemany("UPDATE expenses SET state = ? WHERE id = ?", [(CONFLICT, i) for i in conflicted])
+            conn.executemany(
+                "INSERT OR REPLACE INTO conflicts (expense_id, db_name, trip, local, remote, detected_at) "
+                "SELECT id, db_name, trip, doc, ?, ? FROM expenses WHERE id = ?",
+                [(_dumps(remote[i]), now, i) for i in conflicted],
+            )
+            conn.executemany("DELETE FROM outbox WHERE expense_id = ?", [(i,) for i in synced + conflicted])
+        return len(inserted), len(synced) - len(inserted), len(conflicted)
+
+    def _record_failure(self, expense_ids, error, transient):
+        with self._conn() as conn:
+            conn.executemany(
+                "UPDATE outbox SET attempts = attempts + 1, last_error = ? WHERE expense_id = ?",
+                [(error, i) for i in expense_ids],
+            )
+            if not transient:
+                conn.executemany(
+                    "UPDATE expenses SET state = ? WHERE id = ? AND id IN "
+                    "(SELECT expense_id FROM outbox WHERE attempts >= ?)",
+                    [(FAILED, i, MAX_ATTEMPTS) for i in expense_ids],
+                )
+
+    def sync(self, get_collection, batch_size=DEFAULT_SYNC_BATCH):
+        # get_collection(db_name, trip) -> pymongo collection. Stops at the
+        # first network error; the caller decides when to try again. Rows the
+        # server refuses are left for the next pass.
+        started = time.perf_counter()
+        pushed = already = conflicts = batches = 0
+        error = None
+        refused = []
+        with self._sync_lock:
+            while error is None:
+                rows = self._conn().execute(
+                    "SELECT o.expense_id, o.db_name, o.trip, e.doc FROM outbox o JOIN expenses e ON e.id = o.expense_id "
+                    f"WHERE e.state = ? AND o.expense_id NOT IN ({', '.join('?' * len(refused))}) ORDER BY o.seq LIMIT ?",
+                    (PENDING, *refused, batch_size),
+                ).fetchall()
+                if not rows:
+                    break
+                by_trip = {}
+                for expense_id, db_name, trip, doc in rows:
+                    by_trip.setdefault((db_name, trip), []).append((expense_id, doc))
+                for (db_name, trip), trip_rows in by_trip.items():
+                    try:
+                        p, a, c, rejected = self._push(get_collection(db_name, trip), trip_rows)
+                    except PyMongoError as exc:
+                        error = str(exc)
+                        transient = isinstance(exc, NETWORK_ERRORS)
+                        if transient:
+                            self.mark_offline()
+                        self._record_failure([expense_id for expense_id, _ in trip_rows], error, transient)
+                        break
+                    for expense_id, reason in rejected.items():
+                        self._record_failure([expense_id], reason, False)
+                    refused.extend(rejected)
+                    pushed, already, conflicts = pushed + p, already + a, conflicts + c
+                batches += 1
+            if error is None:
+                self.last_failure = None
+                self.last_sync = time.time()
+        return SyncReport(pushed, already, conflicts, len(refused), batches, error, time.perf_counter() - started)
+
+
+# --- Shared Store & Background Sync ---
+_lock = threading.Lock()
+_stores = {}
+_syncers = {}
+
+
+def get_store(path=None):
+    path = path or DEFAULT_PATH
+    with _lock:
+        if path not in _stores:
+            _stores[path] = LocalStore(path)
+        return _stores[path]
+
+
+class _Syncer(threading.Thread):
+    def __init__(self, store, get_collection, interval):
+        super().__init__(name="local-store-sync", daemon=True)
+        self.store = store
+        self.get_collection = get_collection
+        self.interval = interval
+        self.wake = threading.Event()
+        self.last_report = None
+        self.last_error = None
+
+    def run(self):
+        failures = 0
+        while True:
+            wait = min(MAX_BACKOFF_S, RETRY_BASE_S * 2 ** (failures - 1)) if failures else self.interval
+            self.wake.wait(wait)
+            self.wake.clear()
+            try:
+                self.last_report = self.store.sync(self.get_collection)
+                error = self.last_report.error or self.store.refresh_mirrors(self.get_collection)
+            except Exception as exc:
+                # Anything else (e.g. "database is locked" from SQLite) is
+                # recorded and retried with backoff; the thread must not die.
+                error = f"{type(exc).__name__}: {exc}"
+            self.last_error = error
+            failures = failures + 1 if error else 0
+
+
+def start_sync(store, get_collection, interval=SYNC_INTERVAL_S):
+    # One sync thread per store per process; later calls just return it, or
+    # start a new one if it is no longer running.
+    with _lock:
+        syncer = _syncers.get(store.path)
+        if syncer is None or not syncer.is_alive():
+            syncer = _syncers[store.path] = _Syncer(store, get_collection, interval)
+            syncer.start()
+        return syncer
+
+
+def request_sync(store):
+    syncer = _syncers.get(store.path)
+    if syncer is not None:
+        syncer.wake.set()
+
+
+# --- Command Line ---
+# python local_store.py [status|sync] [--path .trip_splitter/local.db]
+if __name__ == "__main__":
+    import argparse
+
+    import trip_db
+
+    parser = argparse.ArgumentParser(description="Inspect or push the offline expense store")
+    parser.add_argument("command", choices=("status", "sync"), nargs="?", default="status")
+    parser.add_argument("--path", default=DEFAULT_PATH)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_SYNC_BATCH)
+    args = parser.parse_args()
+
+    store = get_store(args.path)
+    if args.command == "sync":
+        config = trip_db.load_config()
+        report = store.sync(lambda db_name, trip: trip_db.get_trip_collection(config, db_name, trip), args.batch_size)
+        print(f"{report.pushed} pushed, {report.already_synced} already on server, {report.conflicts} conflicts, "
+              f"{report.rejected} refused "
+              f"in {report.batches} batches ({report.elapsed_s:.2f}s)")
+        if report.error:
+            print(f"stopped: {report.error}")
+    print(json.dumps(store.status(), indent=2))
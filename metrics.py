@@ -0,0 +1,160 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+# --- Rerun Instrumentation ---
+# Pages wrap each phase of a rerun in span("name", docs=...). Every span is
+# added to the current run (shown by the page's debug panel) and to
+# process-wide per-phase samples, from which p50/p99 are reported.
+#
+# Two exports, both optional and set through environment variables:
+#   TRIP_SPLITTER_METRICS_LOG   file that gets one JSON line per rerun
+#   TRIP_SPLITTER_METRICS_FILE  Prometheus text file rewritten after each rerun
+#                               (for node_exporter's textfile collector)
+# The same JSON lines also go to the "trip_splitter.metrics" logger.
+# A fragment-only rerun (st.fragment) runs no page code around it, so its
+# spans are not part of any run and are reported under page="fragment".
+
+SAMPLES_PER_PHASE = 2048
+QUANTILES = (0.5, 0.9, 0.99)
+METRIC_PREFIX = "trip_splitter"
+
+LOG_PATH = os.environ.get("TRIP_SPLITTER_METRICS_LOG")
+PROMETHEUS_PATH = os.environ.get("TRIP_SPLITTER_METRICS_FILE")
+
+logger = logging.getLogger("trip_splitter.metrics")
+
+_lock = threading.Lock()
+_samples = defaultdict(lambda: deque(maxlen=SAMPLES_PER_PHASE))
+_totals = defaultdict(lambda: {"count": 0, "sum_s": 0.0, "docs": 0})
+_current = threading.local()
+_log_handler = None
+
+
+class Run:
+    def __init__(self, page):
+        self.page = page
+        self.started = time.perf_counter()
+        self.spans = []
+        self.total_ms = None
+
+
+def begin_run(page):
+    run = Run(page)
+    _current.run = run
+    return run
+
+
+def current_run():
+    run = getattr(_current, "run", None)
+    return run if run is not None and run.total_ms is None else None
+
+
+def _record(page, name, seconds, docs):
+    key = (page, name)
+    with _lock:
+        _samples[key].append(seconds)
+        totals = _totals[key]
+        totals["count"] += 1
+        totals["sum_s"] += seconds
+        totals["docs"] += docs or 0
+
+
+@contextmanager
+def span(name, **attrs):
+    # attrs may be updated inside the block, e.g. attrs["docs"] = len(rows).
+    run = current_run()
+    started = time.perf_counter()
+    try:
+        yield attrs
+    finally:
+        seconds = time.perf_counter() - started
+        page = run.page if run else "fragment"
+        _record(page, name, seconds, attrs.get("docs"))
+        if run is not None:
+            run.spans.append(dict(attrs, name=name, ms=round(1000 * seconds, 2)))
+
+
+def end_run():
+    run = current_run()
+    if run is None:
+        return None
+    seconds = time.perf_counter() - run.started
+    run.total_ms = round(1000 * seconds, 2)
+    _record(run.page, "rerun", seconds, None)
+    line = json.dumps({"event": "rerun", "page": run.page, "ts": time.time(), "total_ms": run.total_ms, "spans": run.spans})
+    _write_log(line)
+    if PROMETHEUS_PATH:
+        write_prometheus(PROMETHEUS_PATH)
+    return run
+
+
+def _write_log(line):
+    global _log_handler
+    if LOG_PATH and _log_handler is None:
+        with _lock:
+            if _log_handler is None:
+                _log_handler = logging.FileHandler(LOG_PATH, encoding="utf-8")
+                _log_handler.setFormatter(logging.Formatter("%(message)s"))
+                logger.addHandler(_log_handler)
+                logger.setLevel(logging.INFO)
+    logger.info(line)
+
+
+# --- Percentiles & Export ---
+def _quantile(ordered, q):
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def phase_stats():
+    # [{page, phase, count, p50_ms, p90_ms, p99_ms, mean_ms, docs}] over the recent samples.
+    with _lock:
+        snapshot = {key: sorted(samples) for key, samples in _samples.items()}
+        totals = {key: dict(t) for key, t in _totals.items()}
+    stats = []
+    for (page, phase), ordered in sorted(snapshot.items()):
+        row = {"page": page, "phase": phase, "count": totals[(page, phase)]["count"]}
+        for q in QUANTILES:
+            row[f"p{int(q * 100)}_ms"] = round(1000 * _quantile(ordered, q), 2)
+        row["mean_ms"] = round(1000 * totals[(page, phase)]["sum_s"] / row["count"], 2)
+        row["docs"] = totals[(page, phase)]["docs"]
+        stats.append(row)
+    return stats
+
+
+def prometheus_text():
+    with _lock:
+        snapshot = {key: sorted(samples) for key, samples in _samples.items()}
+        totals = {key: dict(t) for key, t in _totals.items()}
+    name = f"{METRIC_PREFIX}_phase_seconds"
+    lines = [f"# HELP {name} Time spent per phase of a page rerun.", f"# TYPE {name} summary"]
+    for (page, phase), ordered in sorted(snapshot.items()):
+        labels = f'page="{page}",phase="{phase}"'
+        for q in QUANTILES:
+            lines.append(f'{name}{{{labels},quantile="{q}"}} {_quantile(ordered, q):.6f}')
+        lines.append(f"{name}_sum{{{labels}}} {totals[(page, phase)]['sum_s']:.6f}")
+        lines.append(f"{name}_count{{{labels}}} {totals[(page, phase)]['count']}")
+    docs = f"{METRIC_PREFIX}_phase_documents_total"
+    lines += [f"# HELP {docs} Documents handled per phase.", f"# TYPE {docs} counter"]
+    for (page, phase), t in sorted(totals.items()):
+        if t["docs"]:
+            lines.append(f'{docs}{{page="{page}",phase="{phase}"}} {t["docs"]}')
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus(path):
+    # Written to a temp file and renamed, so a scraper never sees half a file.
+    tmp = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(prometheus_text())
+    os.replace(tmp, path)
+
+
+def reset():
+    with _lock:
+        _samples.clear()
+        _totals.clear()
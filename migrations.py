@@ -0,0 +1,106 @@
+import argparse
+import time
+
+from pymongo import ReplaceOne, UpdateOne
+
+import expense_cache
+import expense_schema
+import expense_views
+import money
+import trip_db
+import trip_summary
+
+# --- Data Migrations ---
+# python migrations.py {paise,compact} <db_name> [<trip_name> ...] [--batch-size 500]
+# With no trip names every collection in the database is migrated. Each
+# migration takes an optional on_batch(done, total) progress callback.
+
+
+# Float rupee "amount" -> int64 "amount_paise". Safe to re-run: only documents
+# still missing amount_paise are touched.
+def migrate_paise(collection, batch_size=500, on_batch=None):
+    # Schema v2 documents ("a") are always in paise already.
+    query = {"$and": [trip_summary.EXPENSE_FILTER, {"amount_paise": {"$exists": False}}, {"a": {"$exists": False}}]}
+    total = collection.count_documents(query)
+    converted, batch = 0, []
+    for e in collection.find(query, {"amount": 1}):
+        batch.append(UpdateOne(
+            {"_id": e["_id"], "amount_paise": {"$exists": False}},
+            {"$set": {"amount_paise": money.stored_paise(e["amount"])}, "$unset": {"amount": ""}},
+        ))
+        if len(batch) >= batch_size:
+            converted += collection.bulk_write(batch, ordered=False).modified_count
+            batch = []
+            if on_batch:
+                on_batch(converted, total)
+    if batch:
+        converted += collection.bulk_write(batch, ordered=False).modified_count
+        if on_batch:
+            on_batch(converted, total)
+    if converted:
+        # Existing documents changed: other processes drop their cached copies.
+        trip_summary.bump_version(collection, rewrite=True)
+    trip_summary.rebuild_summary(collection)
+    expense_cache.invalidate(collection)
+    return converted
+
+
+# v1 expense documents -> compact schema v2 (see expense_schema.py), in place.
+# The roster is filled from every name in the trip and the trip is switched
+# to v2 first, so new writes are compact from then on; existing documents are
+# then replaced batch by batch, each only if it is still v1. Totals do not
+# change, so the summary and checkpoints stay as they are. The index that
+# covers balance and category reads of v2 documents (expense_views.py) is
+# created at the end. Safe to re-run.
+def migrate_compact(collection, batch_size=500, on_batch=None):
+    query = {"$and": [trip_summary.EXPENSE_FILTER, {"a": {"$exists": False}}]}
+    # First-seen order, which for most trips is the order the page lists the crew in.
+    names = expense_schema.names_in(collection.find(query, {"_id": 0, "paid_by": 1, "included": 1}).sort("_id", 1))
+    collection.update_one(
+        {"_id": trip_summary.META_ID},
+        {"$set": {"schema": expense_schema.SCHEMA_V2}, "$setOnInsert": {"type": "meta"}},
+        upsert=True,
+    )
+    people = trip_summary.register_people(collection, names, trip_summary.trip_people(collection))
+    index = {name: i for i, name in enumerate(people)}
+    total = collection.count_documents(query)
+    converted, batch = 0, []
+    for e in collection.find(query):
+        batch.append(ReplaceOne({"_id": e["_id"], "a": {"$exists": False}}, expense_schema.encode(e, index)))
+        if len(batch) >= batch_size:
+            converted += collection.bulk_write(batch, ordered=False).modified_count
+            batch = []
+            if on_batch:
+                on_batch(converted, total)
+    if batch:
+        converted += collection.bulk_write(batch, ordered=False).modified_count
+        if on_batch:
+            on_batch(converted, total)
+    if converted:
+        trip_summary.bump_version(collection, rewrite=True)
+    expense_views.ensure_indexes(collection)
+    expense_cache.invalidate(collection)
+    return converted
+
+
+MIGRATIONS = {"paise": migrate_paise, "compact": migrate_compact}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migrate stored trips to a newer document format")
+    parser.add_argument("migration", choices=sorted(MIGRATIONS))
+    parser.add_argument("db_name")
+    parser.add_argument("trips", nargs="*")
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    config = trip_db.load_config()
+    db = trip_db.get_client(config)[args.db_name]
+    for trip_name in args.trips or sorted(db.list_collection_names()):
+        started = time.perf_counter()
+
+        def progress(done, total):
+            print(f"{trip_name}: {done}/{total} documents ({time.perf_counter() - started:.1f}s)", flush=True)
+
+        changed = MIGRATIONS[args.migration](db[trip_name], args.batch_size, progress)
+        print(f"{trip_name}: {changed} documents migrated in {time.perf_counter() - started:.2f}s")
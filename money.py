@@ -0,0 +1,48 @@
+from decimal import ROUND_HALF_UP, Decimal
+
+from bson.int64 import Int64
+
+# --- Fixed-point Money ---
+# Amounts are kept as whole paise (int64) from the moment they are entered;
+# rupee floats only appear again when something is shown on screen.
+PAISE_PER_RUPEE = 100
+
+
+def to_paise(rupees):
+    # Via str so 0.1 + 0.2 style float noise does not leak into the ledger.
+    return int(Decimal(str(rupees)).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP) * PAISE_PER_RUPEE)
+
+
+def to_rupees(paise):
+    return paise / PAISE_PER_RUPEE
+
+
+def stored_paise(rupees):
+    # BSON Int64 so small amounts are not stored as 32-bit ints.
+    return Int64(to_paise(rupees))
+
+
+# Expenses written before the paise ledger carry a float "amount" in rupees.
+def expense_paise(e):
+    if "amount_paise" in e:
+        return int(e["amount_paise"])
+    return to_paise(e["amount"])
+
+
+# Adds the missing one of amount_paise / amount (rupees, for display) in place.
+def normalize(e):
+    e["amount_paise"] = expense_paise(e)
+    e["amount"] = to_rupees(e["amount_paise"])
+    return e
+
+
+# --- Exact Splits ---
+# Every share is amount // n; the amount % n leftover paise go one each to the
+# first names in sorted order, so the shares always add up to the amount and
+# the same expense splits the same way everywhere (Python, NumPy, MongoDB).
+def split_paise(amount, names):
+    if not names:
+        raise ValueError("nobody to split with")
+    ordered = sorted(names)
+    base, remainder = divmod(amount, len(ordered))
+    return {name: base + (1 if i < remainder else 0) for i, name in enumerate(ordered)}
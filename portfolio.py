@@ -0,0 +1,50 @@
+import time
+from collections import defaultdict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import trip_cache
+import trip_summary
+
+# --- Cross-trip Portfolio ---
+# Every trip is its own collection. Summaries are fetched concurrently on a
+# bounded thread pool (the shared MongoClient is thread-safe and pools the
+# connections), then per-person balances are merged across trips.
+
+DEFAULT_WORKERS = 8
+
+TripResult = namedtuple("TripResult", ["trip", "summary", "latency_ms", "error"])
+
+
+def list_trips(db):
+    return sorted(name for name in db.list_collection_names() if not name.startswith("system."))
+
+
+# Read-only: a trip without a summary document is summed on the fly rather
+# than having one written for it. Unchanged trips cost one find_one.
+def _load(collection):
+    return trip_summary.load_summary(collection) or trip_summary.compute_summary(collection)
+
+
+def _fetch(collection):
+    started = time.perf_counter()
+    try:
+        version = trip_summary.trip_version(collection)
+        summary = trip_cache.get_or_compute(collection.full_name, version, "portfolio_summary", lambda: _load(collection))
+        return TripResult(collection.name, summary, 1000 * (time.perf_counter() - started), None)
+    except Exception as exc:
+        return TripResult(collection.name, None, 1000 * (time.perf_counter() - started), str(exc))
+
+
+def fetch_summaries(db, trip_names, max_workers=DEFAULT_WORKERS):
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        return list(pool.map(lambda name: _fetch(db[name]), trip_names))
+
+
+def merge_balances(results):
+    net = defaultdict(int)
+    for r in results:
+        if r.summary is None:
+            continue
+        for p in set(r.summary["paid"]) | set(r.summary["owed"]):
+            net[p] += r.summary["paid"][p] - r.summary["owed"][p]
+    return dict(net)
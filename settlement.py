@@ -0,0 +1,172 @@
+import time
+from collections import defaultdict, namedtuple
+
+import numpy as np
+
+# --- Settlement Engine ---
+# Net balances are settled in whole paise. Someone who owes and someone who is
+# owed can always be cleared with at most n - 1 transfers; the fewest possible
+# is n minus the largest number of disjoint groups whose balances sum to zero,
+# since each such group settles on its own with size - 1 transfers.
+
+Settlement = namedtuple("Settlement", ["transactions", "algorithm", "elapsed_ms"])
+
+# Above this many non-zero balances the exact search (2^n subsets) is skipped.
+EXACT_LIMIT = 20
+DEFAULT_TIME_BUDGET_S = 0.5
+
+
+# --- Greedy (the original optimize_settlements) ---
+def greedy_settlements(bal):
+    creditors = {k: v for k, v in bal.items() if v > 0}
+    debtors = {k: -v for k, v in bal.items() if v < 0}
+    txns = []
+    creditors = dict(sorted(creditors.items(), key=lambda x: -x[1]))
+    debtors = dict(sorted(debtors.items(), key=lambda x: -x[1]))
+    for d in debtors:
+        for c in creditors:
+            if debtors[d] == 0:
+                break
+            if creditors[c] == 0:
+                continue
+            amt = round(min(debtors[d], creditors[c]), 2)
+            if amt > 0:
+                txns.append((d, c, amt))
+                debtors[d] -= amt
+                creditors[c] -= amt
+    return txns
+
+
+def _to_paise(balances):
+    paise = {p: int(round(b * 100)) for p, b in balances.items()}
+    # Balances rounded to two decimals may not add up to exactly zero; the
+    # stray paise are put on the largest balance so every group can close.
+    drift = sum(paise.values())
+    if drift:
+        largest = max(paise, key=lambda p: abs(paise[p]))
+        paise[largest] -= drift
+    return {p: v for p, v in paise.items() if v}
+
+
+# Clears one zero-sum group, biggest debtor against biggest creditor.
+def _settle_group(names, paise):
+    debtors = sorted(((-paise[n], n) for n in names if paise[n] < 0), reverse=True)
+    creditors = sorted(((paise[n], n) for n in names if paise[n] > 0), reverse=True)
+    txns = []
+    i = j = 0
+    while i < len(debtors) and j < len(creditors):
+        owe, d = debtors[i]
+        due, c = creditors[j]
+        amt = min(owe, due)
+        txns.append((d, c, amt))
+        debtors[i] = (owe - amt, d)
+        creditors[j] = (due - amt, c)
+        if debtors[i][0] == 0:
+            i += 1
+        if creditors[j][0] == 0:
+            j += 1
+    return txns
+
+
+# --- Exact: subset DP over bitmasks ---
+def _zero_sum_groups(names, values):
+    n = len(values)
+    size = 1 << n
+    sums = np.zeros(size, dtype=np.int64)
+    for i, v in enumerate(values):
+        sums[1 << i: 2 << i] = sums[:1 << i] + v
+    closes = (sums == 0).astype(np.int32)
+    closes[0] = 0
+
+    # best[mask] = most zero-sum groups the members of mask can be split into.
+    # Masks are filled one popcount layer at a time so every mask's subsets
+    # (one member fewer) are final before it is computed.
+    masks = np.arange(size, dtype=np.int64)
+    popcount = np.zeros(size, dtype=np.int32)
+    for i in range(n):
+        popcount += ((masks >> i) & 1).astype(np.int32)
+    best = np.zeros(size, dtype=np.int32)
+    for k in range(1, n + 1):
+        layer = masks[popcount == k]
+        top = np.zeros(len(layer), dtype=np.int32)
+        for i in range(n):
+            has = (layer >> i) & 1 == 1
+            top = np.maximum(top, np.where(has, best[layer ^ (1 << i)], 0))
+        best[layer] = top + closes[layer]
+
+    # Walk back from everyone; every zero-sum mask on the way closes a group.
+    groups = []
+    mask, boundary = size - 1, size - 1
+    while mask:
+        for i in range(n):
+            bit = 1 << i
+            if mask & bit and best[mask ^ bit] == best[mask] - closes[mask]:
+                mask ^= bit
+                break
+        if closes[mask] or not mask:
+            group = boundary ^ mask
+            groups.append([names[i] for i in range(n) if group >> i & 1])
+            boundary = mask
+    return groups
+
+
+# --- Heuristic for larger groups ---
+# Pulls out zero-sum pairs, then triples, while time remains; whatever is
+# left is cleared greedily as one group.
+def _heuristic_groups(names, paise, deadline):
+    remaining = set(names)
+    groups = []
+    by_value = defaultdict(list)
+    for name in names:
+        by_value[paise[name]].append(name)
+    for name in names:
+        if name not in remaining or paise[name] <= 0:
+            continue
+        for match in by_value[-paise[name]]:
+            if match in remaining:
+                groups.append([name, match])
+                remaining -= {name, match}
+                break
+
+    positives = [n for n in names if n in remaining and paise[n] > 0]
+    negatives = [n for n in names if n in remaining and paise[n] < 0]
+    timed_out = False
+    for pos_side, neg_side in ((positives, negatives), (negatives, positives)):
+        # One member on this side balanced by two on the other.
+        for single in pos_side:
+            if time.perf_counter() > deadline:
+                timed_out = True
+                break
+            if single not in remaining:
+                continue
+            seen = {}
+            for other in neg_side:
+                if other not in remaining:
+                    continue
+                need = -paise[single] - paise[other]
+                if need in seen and seen[need] in remaining:
+                    groups.append([single, other, seen[need]])
+                    remaining -= {single, other, seen[need]}
+                    break
+                seen[paise[other]] = other
+    if remaining:
+        groups.append([n for n in names if n in remaining])
+    return groups, timed_out
+
+
+def settle(balances, time_budget=DEFAULT_TIME_BUDGET_S, exact_limit=EXACT_LIMIT):
+    started = time.perf_counter()
+    paise = _to_paise(balances)
+    names = sorted(paise, key=lambda p: -abs(paise[p]))
+    if not names:
+        algorithm, groups = "none", []
+    elif len(names) <= exact_limit:
+        algorithm = "exact-subset-dp"
+        groups = _zero_sum_groups(names, [paise[n] for n in names])
+    else:
+        groups, timed_out = _heuristic_groups(names, paise, started + time_budget)
+        algorithm = "heuristic" + (" (time budget hit)" if timed_out else "")
+    txns = []
+    for group in groups:
+        txns.extend((d, c, amt / 100) for d, c, amt in _settle_group(group, paise))
+    return Settlement(txns, algorithm, round(1000 * (time.perf_counter() - started), 3))
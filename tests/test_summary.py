@@ -0,0 +1,119 @@
+import os
+from datetime import timedelta
+
+import pytest
+from pymongo.errors import OperationFailure
+
+import balance_engine
+import money
+import trip_summary
+from benchmarks import synthetic
+
+# The stored summary, the Python recompute, checkpoints, the NumPy engine and
+# the server-side aggregation must agree to the paisa on the same trip.
+# Runs on mongomock; set TRIP_SPLITTER_TEST_MONGO_URI to a scratch mongod to
+# run the aggregation too (mongomock lacks the operators it needs).
+
+MONGO_URI = os.environ.get("TRIP_SPLITTER_TEST_MONGO_URI")
+
+# Legacy rupee floats that sit exactly on half a paisa, plus float noise.
+LEGACY_AMOUNTS = [1.005, 2.675, 0.125, 10.115, 99.995, 0.1 + 0.2, 1234.565, 7.0]
+
+
+@pytest.fixture
+def collection(request):
+    if MONGO_URI:
+        import pymongo
+
+        client = pymongo.MongoClient(MONGO_URI)
+    else:
+        mongomock = pytest.importorskip("mongomock")
+        client = mongomock.MongoClient()
+    collection = client["trip_splitter_tests"][request.node.name]
+    collection.drop()
+    yield collection
+    collection.drop()
+
+
+def _load(collection, participants, seed, legacy=False):
+    trip = synthetic.generate_trip(1200, participants, seed=seed)
+    if legacy:
+        # Written before the paise ledger: float rupees, no summary document.
+        for i, e in enumerate(trip):
+            e["amount"] = LEGACY_AMOUNTS[i % len(LEGACY_AMOUNTS)]
+            del e["amount_paise"]
+        collection.insert_many([dict(e) for e in trip])
+    else:
+        synthetic.load_trip(collection, trip)
+    return trip, synthetic.participant_names(participants)
+
+
+@pytest.mark.parametrize("participants,seed,legacy", [(7, 0, False), (20, 1, False), (3, 2, True)])
+def test_summaries_agree(collection, participants, seed, legacy):
+    trip, names = _load(collection, participants, seed, legacy)
+    reference = trip_summary.add_expenses(None, trip)
+    assert trip_summary.compare_summaries(trip_summary.compute_summary(collection), reference) == []
+    assert trip_summary.compare_summaries(trip_summary.get_summary(collection), reference) == []
+    assert trip_summary.compare_summaries(trip_summary.checkpoint_summary(collection), reference) == []
+    assert trip_summary.compare_summaries(balance_engine.summarize(trip, names), reference) == []
+
+
+@pytest.mark.parametrize("participants,seed,legacy", [(7, 0, False), (3, 2, True)])
+def test_aggregation_agrees(collection, participants, seed, legacy):
+    if not MONGO_URI:
+        pytest.skip("mongomock cannot run the summary pipeline ($sortArray, $toDecimal)")
+    trip, _ = _load(collection, participants, seed, legacy)
+    try:
+        aggregated = trip_summary.aggregate_summary(collection)
+    except OperationFailure as exc:
+        pytest.skip(f"server too old for the summary pipeline (needs MongoDB 5.2+): {exc}")
+    assert trip_summary.compare_summaries(aggregated, trip_summary.add_expenses(None, trip)) == []
+
+
+def test_half_paisa_rounds_away_from_zero():
+    assert [money.to_paise(a) for a in (1.005, 2.675, 0.125, -0.125, 0.1 + 0.2)] == [101, 268, 13, -13, 30]
+
+
+def test_first_write_counts_expenses_already_stored(collection):
+    # A trip from before the summary document: the first write through the
+    # write path must not leave a summary that only counts itself.
+    trip, _ = _load(collection, 3, 4, legacy=True)
+    new = synthetic.generate_trip(1, 3, seed=5)
+    trip_summary.record_expenses(collection, [dict(e) for e in new])
+    assert trip_summary.load_summary(collection)["count"] == len(trip) + 1
+    assert trip_summary.compare_summaries(trip_summary.get_summary(collection), trip_summary.add_expenses(None, trip + new)) == []
+
+
+def test_interrupted_claim_is_finished_later(collection, monkeypatch):
+    # Outbox documents land marked uncounted; a writer dying after the summary
+    # $inc but before clearing the marker must not lose or double count them.
+    trip, _ = _load(collection, 3, 6)
+    new = [dict(e, uncounted=True) for e in synthetic.generate_trip(2, 3, seed=7)]
+    collection.insert_many(new)
+    ids = [e["_id"] for e in new]
+    apply_delta = trip_summary._apply_delta
+
+    def crash(*args, **kwargs):
+        apply_delta(*args, **kwargs)
+        raise RuntimeError("writer died")
+
+    monkeypatch.setattr(trip_summary, "_apply_delta", crash)
+    with pytest.raises(RuntimeError):
+        trip_summary._count_uncounted(collection, ids)
+    monkeypatch.setattr(trip_summary, "_apply_delta", apply_delta)
+    assert trip_summary._count_uncounted(collection, ids) == []
+    monkeypatch.setattr(trip_summary, "CLAIM_TIMEOUT", timedelta(seconds=-2))
+    assert len(trip_summary._count_uncounted(collection, ids)) == 2
+    assert collection.count_documents({"uncounted": {"$exists": True}}) == 0
+    for e in new:
+        del e["uncounted"]
+    assert trip_summary.compare_summaries(trip_summary.load_summary(collection), trip_summary.add_expenses(None, trip + new)) == []
+
+
+def test_expense_with_nobody_to_split_with_is_refused(collection):
+    expense = dict(synthetic.generate_trip(1, 3)[0], included=[])
+    with pytest.raises(ValueError, match="nobody to split with"):
+        trip_summary.record_expenses(collection, [expense])
+    assert collection.count_documents({}) == 0
+    # Folded in as an unsent expense, it is left out rather than breaking the page.
+    assert trip_summary.add_expenses(None, [expense])["count"] == 0
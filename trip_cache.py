@@ -0,0 +1,43 @@
+import threading
+from collections import OrderedDict
+
+# --- Version-keyed Cache ---
+# Process-wide memo for anything derived from a trip: DataFrames, aggregates,
+# settlements, pages of the day log. Every entry is stored under the trip's
+# version (trip_summary.trip_version), so once any process writes to the trip
+# the old entries are never hit again and simply age out of the LRU.
+
+MAX_ENTRIES = 256
+
+_lock = threading.Lock()
+_cache = OrderedDict()
+_stats = {"hits": 0, "misses": 0}
+
+
+def get_or_compute(trip_key, version, name, compute):
+    # A version of None (e.g. no server connection) means "don't cache".
+    if version is None:
+        return compute()
+    key = (trip_key, version, name)
+    with _lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            _stats["hits"] += 1
+            return _cache[key]
+        _stats["misses"] += 1
+    value = compute()
+    with _lock:
+        _cache[key] = value
+        while len(_cache) > MAX_ENTRIES:
+            _cache.popitem(last=False)
+    return value
+
+
+def cache_stats():
+    with _lock:
+        return dict(_stats, entries=len(_cache), max_entries=MAX_ENTRIES)
+
+
+def clear():
+    with _lock:
+        _cache.clear()
@@ -0,0 +1,188 @@
+import threading
+import time
+
+from pymongo import MongoClient, monitoring
+
+# --- Pool Settings ---
+# Keys read from st.secrets["mongo"]; anything missing falls back to these.
+DEFAULT_POOL_OPTIONS = {
+    "max_pool_size": 20,
+    "min_pool_size": 0,
+    "max_idle_time_ms": 60000,
+    "wait_queue_timeout_ms": 5000,
+    "server_selection_timeout_ms": 5000,
+    "connect_timeout_ms": 5000,
+    "socket_timeout_ms": 20000,
+}
+
+_CLIENT_KWARGS = {
+    "max_pool_size": "maxPoolSize",
+    "min_pool_size": "minPoolSize",
+    "max_idle_time_ms": "maxIdleTimeMS",
+    "wait_queue_timeout_ms": "waitQueueTimeoutMS",
+    "server_selection_timeout_ms": "serverSelectionTimeoutMS",
+    "connect_timeout_ms": "connectTimeoutMS",
+    "socket_timeout_ms": "socketTimeoutMS",
+}
+
+
+# --- Pool Usage Tracking ---
+class PoolStats(monitoring.ConnectionPoolListener):
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = threading.local()
+        self.created = 0
+        self.closed = 0
+        self.checked_out = 0
+        self.checkouts = 0
+        self.checkout_failures = 0
+        self.total_wait_s = 0.0
+        self.max_wait_s = 0.0
+
+    def _wait_started(self):
+        self._pending.started = time.perf_counter()
+
+    def _wait_finished(self):
+        started = getattr(self._pending, "started", None)
+        self._pending.started = None
+        return time.perf_counter() - started if started is not None else 0.0
+
+    def connection_check_out_started(self, event):
+        self._wait_started()
+
+    def connection_checked_out(self, event):
+        waited = self._wait_finished()
+        with self._lock:
+            self.checked_out += 1
+            self.checkouts += 1
+            self.total_wait_s += waited
+            self.max_wait_s = max(self.max_wait_s, waited)
+
+    def connection_check_out_failed(self, event):
+        self._wait_finished()
+        with self._lock:
+            self.checkout_failures += 1
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checked_out -= 1
+
+    def connection_created(self, event):
+        with self._lock:
+            self.created += 1
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.closed += 1
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "open_connections": self.created - self.closed,
+                "checked_out": self.checked_out,
+                "checkouts": self.checkouts,
+                "checkout_failures": self.checkout_failures,
+                "avg_wait_ms": round(1000 * self.total_wait_s / self.checkouts, 3) if self.checkouts else 0.0,
+                "max_wait_ms": round(1000 * self.max_wait_s, 3),
+            }
+
+
+# --- Shared Client (one per process) ---
+# Streamlit re-executes page scripts on every rerun but imports modules once,
+# so module state here is shared by every session served by this process.
+_lock = threading.Lock()
+_client = None
+_client_key = None
+_stats = None
+# Other pools in this process (async_db.py's), reported by pool_stats too.
+_other_pools = {}
+
+
+def pool_options(config):
+    options = dict(DEFAULT_POOL_OPTIONS)
+    for key in DEFAULT_POOL_OPTIONS:
+        if key in config:
+            options[key] = int(config[key])
+    return options
+
+
+def get_client(config):
+    global _client, _client_key, _stats
+    options = pool_options(config)
+    key = (config["uri"], tuple(sorted(options.items())))
+    if _client is not None and _client_key == key:
+        return _client
+    with _lock:
+        if _client is None or _client_key != key:
+            stats = PoolStats()
+            kwargs = {_CLIENT_KWARGS[k]: v for k, v in options.items()}
+            # connect=False: nothing touches the network until the first query.
+            # A mongodb+srv:// URI would otherwise be resolved through DNS right
+            # here, and a page started offline would fail before it got to the
+            # local store (the error comes from that first query instead).
+            client = MongoClient(config["uri"], event_listeners=[stats], connect=False, **kwargs)
+            if _client is not None:
+                _client.close()
+            _client, _client_key, _stats = client, key, stats
+    return _client
+
+
+def get_trip_collection(config, db_name, trip_name):
+    return get_client(config)[db_name][trip_name]
+
+
+def health_check(config):
+    started = time.perf_counter()
+    try:
+        get_client(config).admin.command("ping")
+        return {"ok": True, "latency_ms": round(1000 * (time.perf_counter() - started), 1)}
+    except Exception as exc:
+        return {"ok": False, "error": str(exc), "latency_ms": round(1000 * (time.perf_counter() - started), 1)}
+
+
+def track_pool(name, stats):
+    # stats: a PoolStats listening on another client's pool; None stops tracking.
+    if stats is None:
+        _other_pools.pop(name, None)
+    else:
+        _other_pools[name] = stats
+
+
+def pool_stats():
+    # This client's pool, with any other tracked pools under their names.
+    stats = _stats.snapshot() if _stats is not None else {}
+    for name, other in list(_other_pools.items()):
+        stats[name] = other.snapshot()
+    return stats
+
+
+def close():
+    global _client, _client_key, _stats
+    with _lock:
+        if _client is not None:
+            _client.close()
+        _client, _client_key, _stats = None, None, None
+
+
+# --- Headless Config ---
+# Command-line tools read the same secrets file Streamlit uses.
+def load_config(path=".streamlit/secrets.toml"):
+    import tomllib
+
+    with open(path, "rb") as f:
+        return tomllib.load(f)["mongo"]
@@ -0,0 +1,593 @@
+import sys
+import threading
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+
+from bson import ObjectId
+from bson.int64 import Int64
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError
+
+import expense_schema
+import money
+
+# --- Trip Documents ---
+# Besides expenses, a trip collection holds a few bookkeeping documents that
+# are told apart by their "type" field.
+SUMMARY_ID = "summary"
+META_ID = "meta"
+META_TYPES = ["summary", "meta", "checkpoint"]
+EXPENSE_FILTER = {"type": {"$nin": META_TYPES}}
+# All summary figures are whole paise; documents without this unit predate
+# the paise ledger and are rebuilt on first read.
+SUMMARY_UNIT = "paise"
+# A checkpoint of the running summary is written every this many expenses.
+CHECKPOINT_EVERY = 500
+# A claim on uncounted expenses not finished in this long (its writer died or
+# lost the connection part way) is finished by the next writer to the trip.
+CLAIM_TIMEOUT = timedelta(minutes=2)
+# Only these meta fields are read to tell whether a trip changed, plus the
+# schema its documents are in, which expense reads project by.
+VERSION_FIELDS = {"_id": 0, "version": 1, "rewrites": 1, "schema": 1}
+# The trip's document schema and roster (see expense_schema.py).
+ROSTER_FIELDS = {"_id": 0, "schema": 1, "people": 1}
+
+
+# Participant and category names become field names inside the summary
+# document, so characters MongoDB treats specially are percent-escaped.
+def _escape(name):
+    return name.replace("%", "%25").replace(".", "%2E").replace("$", "%24")
+
+
+def _unescape(name):
+    return name.replace("%24", "$").replace("%2E", ".").replace("%25", "%")
+
+
+def _empty_summary():
+    return {"total": 0, "count": 0, "paid": defaultdict(int), "owed": defaultdict(int), "categories": defaultdict(int)}
+
+
+def _accumulate(summary, e):
+    # Split first: an expense with nobody to share it raises ValueError
+    # before the summary is touched.
+    amount = money.expense_paise(e)
+    shares = money.split_paise(amount, e['included'])
+    summary["total"] += amount
+    summary["count"] += 1
+    summary["paid"][e['paid_by']] += amount
+    summary["categories"][e['category']] += amount
+    for p, share in shares.items():
+        summary["owed"][p] += share
+
+
+def check_expenses(expenses):
+    # Raises ValueError for an expense the summary could not count, so
+    # writers can refuse it before anything is written.
+    for e in expenses:
+        _accumulate(_empty_summary(), e)
+
+
+def summary_delta(expenses):
+    delta = _empty_summary()
+    for e in expenses:
+        _accumulate(delta, e)
+    inc = {"total": Int64(delta["total"]), "count": delta["count"]}
+    for section in ("paid", "owed", "categories"):
+        for name, value in delta[section].items():
+            inc[f"{section}.{_escape(name)}"] = Int64(value)
+    return inc
+
+
+# --- Trip Version ---
+# The meta document carries a change counter: "version" goes up after every
+# write to the trip, "rewrites" only when existing documents were edited or
+# deleted (appends alone leave it unchanged). Anything derived from a trip can
+# be cached against trip_version() and reused until it moves, in any process.
+def bump_version(collection, rewrite=False):
+    inc = {"version": 1}
+    if rewrite:
+        inc["rewrites"] = 1
+    collection.update_one({"_id": META_ID}, {"$inc": inc, "$setOnInsert": {"type": "meta"}}, upsert=True)
+
+
+def version_from_doc(doc):
+    doc = doc or {}
+    return doc.get("version", 0), doc.get("rewrites", 0)
+
+
+def schema_from_doc(doc):
+    return (doc or {}).get("schema", expense_schema.SCHEMA_V1)
+
+
+def trip_version(collection):
+    return version_from_doc(collection.find_one({"_id": META_ID}, VERSION_FIELDS))
+
+
+# --- Roster & Schema ---
+def trip_people(collection):
+    return (collection.find_one({"_id": META_ID}, ROSTER_FIELDS) or {}).get("people", [])
+
+
+def expense_decoder(collection):
+    # Turns documents of either schema into v1 expenses (see expense_schema.py).
+    return expense_schema.Decoder(lambda: trip_people(collection))
+
+
+def register_people(collection, names, people=()):
+    # Appends names missing from the roster; each $push only applies if the
+    # name is still absent, so concurrent writers cannot add it twice.
+    # Returns the roster afterwards.
+    known = set(people)
+    missing = [n for n in names if n not in known]
+    if not missing:
+        return list(people)
+    for name in missing:
+        collection.update_one({"_id": META_ID, "people": {"$ne": name}}, {"$push": {"people": name}})
+    return trip_people(collection)
+
+
+def _to_stored(collection, meta, expenses):
+    # The documents to write for these expenses, in the trip's schema. Every
+    # expense gets its _id up front so caller and v2 document share it.
+    if meta.get("schema", expense_schema.SCHEMA_V1) != expense_schema.SCHEMA_V2:
+        return expenses
+    for e in expenses:
+        e.setdefault("_id", ObjectId())
+    people = register_people(collection, expense_schema.names_in(expenses), meta.get("people", []))
+    index = {name: i for i, name in enumerate(people)}
+    return [expense_schema.encode(e, index) for e in expenses]
+
+
+# --- Write Path ---
+# Every insert goes through here so the summary document moves with the data.
+# Each expense also gets the next number from the trip's sequence counter, and
+# the trip version is bumped once the expenses and summary are written.
+# Callers pass v1 expenses; trips on schema v2 are written compacted.
+def _allocate(collection, n):
+    # Returns the meta document after taking n sequence numbers.
+    return collection.find_one_and_update(
+        {"_id": META_ID},
+        {"$inc": {"seq": n}, "$setOnInsert": {"type": "meta"}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+def _allocate_seq(collection, n):
+    return _allocate(collection, n)["seq"] - n + 1
+
+
+def record_expenses(collection, expenses):
+    expenses = list(expenses)
+    if not expenses:
+        return []
+    check_expenses(expenses)
+    meta = _allocate(collection, len(expenses))
+    first_seq = meta["seq"] - len(expenses) + 1
+    for i, e in enumerate(expenses):
+        e["seq"] = first_seq + i
+    docs = _to_stored(collection, meta, expenses)
+    if len(expenses) == 1:
+        ids = [collection.insert_one(docs[0]).inserted_id]
+    else:
+        try:
+            ids = collection.insert_many(docs, ordered=False).inserted_ids
+        except BulkWriteError as exc:
+            # Unordered inserts keep going past a bad document; count the ones
+            # that did land before passing the error on.
+            failed = {err["index"] for err in exc.details.get("writeErrors", [])}
+            _apply_delta(collection, [e for i, e in enumerate(expenses) if i not in failed])
+            bump_version(collection)
+            raise
+    _apply_delta(collection, expenses)
+    bump_version(collection)
+    _maybe_checkpoint(collection, first_seq, first_seq + len(expenses) - 1)
+    return ids
+
+
+def _apply_delta(collection, expenses, claim=None):
+    # Only a summary that is already there is moved: one created here would
+    # count just these expenses. A trip without one (or with one from before
+    # the paise ledger) gets it rebuilt instead, these expenses included.
+    # With a claim token (see _count_uncounted) the $inc applies at most once
+    # per token, which is recorded in the same update.
+    if not expenses:
+        return
+    query, update = {"_id": SUMMARY_ID, "unit": SUMMARY_UNIT}, {"$inc": summary_delta(expenses)}
+    if claim is not None:
+        query["claims"], update["$push"] = {"$ne": claim}, {"claims": claim}
+    if collection.update_one(query, update).matched_count:
+        return
+    if collection.count_documents({"_id": SUMMARY_ID, "unit": SUMMARY_UNIT}, limit=1):
+        return  # this claim was already counted
+    rebuild_summary(collection)
+    if claim is not None:
+        # The rebuild leaves out documents still marked uncounted.
+        collection.update_one(query, update)
+
+
+def record_expense(collection, expense):
+    return record_expenses(collection, [expense])[0]
+
+
+# Idempotent variant for writers that pick their own _id (the offline outbox in
+# local_store.py): documents already on the server are left untouched and not
+# counted again, so a batch whose reply was lost can simply be sent again.
+# Documents are inserted marked "uncounted" and only added to the summary once
+# claimed, so a batch cut short after some inserts (a BulkWriteError, or a
+# dropped connection before the summary update) is counted by its retry, and
+# a claim cut short is finished by a later writer (see _count_uncounted).
+def upsert_expenses(collection, expenses):
+    expenses = list(expenses)
+    if not expenses:
+        return []
+    check_expenses(expenses)
+    ensure_indexes(collection)
+    ids = [e["_id"] for e in expenses]
+    existing = {d["_id"] for d in collection.find({"_id": {"$in": ids}}, {"_id": 1})}
+    new = [e for e in expenses if e["_id"] not in existing]
+    inserted, error = [], None
+    if new:
+        meta = _allocate(collection, len(new))
+        first_seq = meta["seq"] - len(new) + 1
+        for i, e in enumerate(new):
+            e["seq"] = first_seq + i
+        ops = [
+            UpdateOne({"_id": d["_id"]}, {"$setOnInsert": dict({k: v for k, v in d.items() if k != "_id"}, uncounted=True)}, upsert=True)
+            for d in _to_stored(collection, meta, new)
+        ]
+        try:
+            upserted = collection.bulk_write(ops, ordered=False).upserted_ids
+        except BulkWriteError as exc:
+            # Unordered upserts keep going past a bad document; count the ones
+            # that did land before passing the error on.
+            upserted = {u["index"]: u["_id"] for u in exc.details.get("upserted", [])}
+            error = exc
+        inserted = [new[i] for i in sorted(upserted)]
+    counted = _count_uncounted(collection, ids)
+    if inserted or counted:
+        bump_version(collection)
+    if error is not None:
+        raise error
+    if new:
+        _maybe_checkpoint(collection, first_seq, first_seq + len(new) - 1)
+    return [e["_id"] for e in inserted]
+
+
+def _count_uncounted(collection, ids):
+    # Claims the still-uncounted documents among ids with a token of our own,
+    # so concurrent writers never count the same document twice, then counts
+    # them: $inc the summary (once per token), unset the documents' marker,
+    # pull the token off the summary. Each step can be run again, so claims
+    # older than CLAIM_TIMEOUT, anywhere in the trip, are finished here too.
+    # Returns the expenses counted.
+    stale = ObjectId.from_datetime(datetime.now(timezone.utc) - CLAIM_TIMEOUT)
+    tokens = collection.distinct("uncounted", {"uncounted": {"$type": "objectId", "$lt": stale}})
+    token = ObjectId()
+    if collection.update_many({"_id": {"$in": ids}, "uncounted": True}, {"$set": {"uncounted": token}}).modified_count:
+        tokens.append(token)
+    decode = expense_decoder(collection)
+    counted = []
+    for token in tokens:
+        expenses = [decode(d) for d in collection.find({"uncounted": token})]
+        _apply_delta(collection, expenses, claim=token)
+        collection.update_many({"uncounted": token}, {"$unset": {"uncounted": ""}})
+        collection.update_one({"_id": SUMMARY_ID}, {"$pull": {"claims": token}})
+        counted.extend(expenses)
+    return counted
+
+
+# --- Read Path ---
+def _decode(doc):
+    summary = _empty_summary()
+    summary["total"] = int(doc.get("total", 0))
+    summary["count"] = doc.get("count", 0)
+    for section in ("paid", "owed", "categories"):
+        for name, value in doc.get(section, {}).items():
+            summary[section][_unescape(name)] = int(value)
+    return summary
+
+
+def summary_from_doc(doc):
+    if not doc or doc.get("unit") != SUMMARY_UNIT:
+        return None
+    return _decode(doc)
+
+
+def load_summary(collection):
+    return summary_from_doc(collection.find_one({"_id": SUMMARY_ID}))
+
+
+def get_summary(collection):
+    # Trips written before the (paise) summary document existed get one built on first read.
+    summary = load_summary(collection)
+    if summary is None:
+        summary = rebuild_summary(collection)
+    return summary
+
+
+# Folds expenses not yet on the server (local_store.py outbox) into a summary.
+# Returns a new summary; the one passed in may be shared through a cache.
+# Expenses the summary cannot count are left out, as the server refuses them.
+def add_expenses(summary, expenses):
+    result = _empty_summary()
+    if summary:
+        result["total"], result["count"] = summary["total"], summary["count"]
+        for section in ("paid", "owed", "categories"):
+            result[section].update(summary[section])
+    for e in expenses:
+        try:
+            _accumulate(result, e)
+        except ValueError:
+            pass
+    return result
+
+
+def summary_balances(summary, participants):
+    return {p: money.to_rupees(summary["paid"][p] - summary["owed"][p]) for p in participants}
+
+
+# --- Server-side Summary ---
+# Same numbers as the summary document, computed by MongoDB in one round trip;
+# only the grouped rows come back over the network.
+# Legacy rupee amounts are converted to paise on the fly; owed shares follow
+# money.split_paise (leftover paise to the first names in sorted order), so
+# $sortArray needs MongoDB 5.2 or later. Schema v2 documents are given their
+# v1 fields first, from the roster passed in (expense_schema.v1_fields).
+# Rupees are rounded the way money.to_paise does it: in decimal (so 1.005 is
+# 100.5 paise, not 100.4999...) and half away from zero, where $round would
+# round half to even.
+_LEGACY_PAISE = {"$let": {
+    "vars": {"paise": {"$multiply": [{"$toDecimal": "$amount"}, 100]}},
+    "in": {"$toLong": {"$cond": [
+        {"$gte": ["$$paise", 0]},
+        {"$floor": {"$add": ["$$paise", 0.5]}},
+        {"$ceil": {"$subtract": ["$$paise", 0.5]}},
+    ]}},
+}}
+AMOUNT_PAISE = {"$ifNull": ["$amount_paise", "$a", _LEGACY_PAISE]}
+
+
+def summary_pipeline(people=()):
+    return [
+        {"$match": EXPENSE_FILTER},
+        {"$project": dict({"_id": 0, "amount": AMOUNT_PAISE}, **expense_schema.v1_fields(people))},
+        {"$facet": {
+            "totals": [{"$group": {"_id": None, "total": {"$sum": "$amount"}, "count": {"$sum": 1}}}],
+            "paid": [{"$group": {"_id": "$paid_by", "amount": {"$sum": "$amount"}}}],
+            "categories": [{"$group": {"_id": "$category", "amount": {"$sum": "$amount"}}}],
+            "owed": [
+                {"$project": {
+                    "included": {"$sortArray": {"input": "$included", "sortBy": 1}},
+                    "base": {"$toLong": {"$floor": {"$divide": ["$amount", {"$size": "$included"}]}}},
+                    "remainder": {"$mod": ["$amount", {"$size": "$included"}]},
+                }},
+                {"$unwind": {"path": "$included", "includeArrayIndex": "position"}},
+                {"$group": {"_id": "$included", "amount": {"$sum": {
+                    "$add": ["$base", {"$cond": [{"$lt": ["$position", "$remainder"]}, 1, 0]}],
+                }}}},
+            ],
+        }},
+    ]
+
+
+def aggregate_summary(collection):
+    result = next(collection.aggregate(summary_pipeline(trip_people(collection))))
+    summary = _empty_summary()
+    if result["totals"]:
+        summary["total"] = int(result["totals"][0]["total"])
+        summary["count"] = result["totals"][0]["count"]
+    for section in ("paid", "owed", "categories"):
+        for row in result[section]:
+            summary[section][row["_id"]] = int(row["amount"])
+    return summary
+
+
+# --- Repair ---
+def compute_summary(collection):
+    # Expenses still marked uncounted are left to the writer counting them.
+    summary = _empty_summary()
+    projection = dict({"_id": 0, "amount": 1, "amount_paise": 1, "paid_by": 1, "category": 1, "included": 1}, **expense_schema.V2_SUMMARY_FIELDS)
+    query = dict(EXPENSE_FILTER, uncounted={"$exists": False})
+    for e in map(expense_decoder(collection), collection.find(query, projection)):
+        _accumulate(summary, e)
+    return summary
+
+
+def _encode(summary, doc_type):
+    doc = {"type": doc_type, "unit": SUMMARY_UNIT, "total": Int64(summary["total"]), "count": summary["count"]}
+    for section in ("paid", "owed", "categories"):
+        doc[section] = {_escape(name): Int64(value) for name, value in summary[section].items()}
+    return doc
+
+
+# Recomputes the summary from the raw expenses and overwrites the stored one.
+def rebuild_summary(collection):
+    summary = compute_summary(collection)
+    collection.replace_one({"_id": SUMMARY_ID}, _encode(summary, "summary"), upsert=True)
+    bump_version(collection)
+    return summary
+
+
+# Lists every figure on which two summaries disagree; all are exact paise.
+def compare_summaries(a, b):
+    mismatches = []
+    for field in ("count", "total"):
+        if a[field] != b[field]:
+            mismatches.append((field, a[field], b[field]))
+    for section in ("paid", "owed", "categories"):
+        for name in sorted(set(a[section]) | set(b[section])):
+            if a[section][name] != b[section][name]:
+                mismatches.append((f"{section}.{name}", a[section][name], b[section][name]))
+    return mismatches
+
+
+# --- Checkpoints ---
+# A checkpoint is the running summary as of expense sequence number "seq".
+# Reads can start from the newest one and fold in only the expenses after it.
+# Checkpoints are pure caches: dropping and rebuilding them loses nothing.
+#
+# Crossing a multiple of CHECKPOINT_EVERY writes the checkpoint for the
+# multiple before it, leaving a full interval of slack for writers that took a
+# sequence number but have not inserted yet. Expenses without "seq" (written
+# before sequence numbers existed) always count as after every checkpoint.
+_SUMMARY_FIELDS = dict({"_id": 0, "seq": 1, "amount": 1, "amount_paise": 1, "paid_by": 1, "category": 1, "included": 1}, **expense_schema.V2_SUMMARY_FIELDS)
+
+
+def _checkpoint_id(seq):
+    return f"checkpoint:{seq}"
+
+
+# Checkpoint lookups (type "checkpoint", newest seq) and the expense scans
+# after a checkpoint (seq ranges) both use one (type, seq) index; finding
+# stale claims uses a sparse index on the uncounted marker. Both are created
+# once per trip per process by whichever function touches the trip first.
+_indexed = set()
+_indexed_lock = threading.Lock()
+
+
+def ensure_indexes(collection):
+    key = collection.full_name
+    if key in _indexed:
+        return
+    with _indexed_lock:
+        if key not in _indexed:
+            collection.create_index([("type", 1), ("seq", 1)])
+            collection.create_index("uncounted", sparse=True)
+            _indexed.add(key)
+
+
+def _after(seq):
+    return {"$and": [EXPENSE_FILTER, {"$or": [{"seq": {"$gt": seq}}, {"seq": {"$exists": False}}]}]}
+
+
+def latest_checkpoint(collection, at_or_before=None):
+    ensure_indexes(collection)
+    query = {"type": "checkpoint"}
+    if at_or_before is not None:
+        query["seq"] = {"$lte": at_or_before}
+    doc = collection.find_one(query, sort=[("seq", -1)])
+    if not doc or doc.get("unit") != SUMMARY_UNIT:
+        return None, 0
+    return _decode(doc), doc["seq"]
+
+
+def _summary_through(collection, seq):
+    # Summary of every sequenced expense up to and including seq.
+    summary, start = latest_checkpoint(collection, at_or_before=seq)
+    summary = summary or _empty_summary()
+    query = {"$and": [EXPENSE_FILTER, {"seq": {"$gt": start, "$lte": seq}}]}
+    for e in map(expense_decoder(collection), collection.find(query, _SUMMARY_FIELDS)):
+        _accumulate(summary, e)
+    return summary
+
+
+def write_checkpoint(collection, seq):
+    summary = _summary_through(collection, seq)
+    doc = _encode(summary, "checkpoint")
+    doc["seq"] = seq
+    collection.replace_one({"_id": _checkpoint_id(seq)}, doc, upsert=True)
+    return summary
+
+
+def _maybe_checkpoint(collection, first_seq, last_seq):
+    ensure_indexes(collection)
+    crossed = last_seq // CHECKPOINT_EVERY
+    if crossed > (first_seq - 1) // CHECKPOINT_EVERY and crossed >= 2:
+        write_checkpoint(collection, (crossed - 1) * CHECKPOINT_EVERY)
+
+
+def checkpoint_summary(collection):
+    summary, seq = latest_checkpoint(collection)
+    summary = summary or _empty_summary()
+    for e in map(expense_decoder(collection), collection.find(_after(seq), _SUMMARY_FIELDS)):
+        _accumulate(summary, e)
+    return summary
+
+
+def verify_checkpoints(collection):
+    # Each checkpoint against a full recompute of the expenses it covers.
+    ensure_indexes(collection)
+    results = []
+    for doc in collection.find({"type": "checkpoint"}).sort("seq", 1):
+        reference = _empty_summary()
+        query = {"$and": [EXPENSE_FILTER, {"seq": {"$lte": doc["seq"]}}]}
+        for e in map(expense_decoder(collection), collection.find(query, _SUMMARY_FIELDS)):
+            _accumulate(reference, e)
+        results.append((doc["seq"], compare_summaries(reference, _decode(doc))))
+    return results
+
+
+def drop_checkpoints(collection):
+    return collection.delete_many({"type": "checkpoint"}).deleted_count
+
+
+# Numbers any expenses still lacking "seq" (in _id order), then rewrites every
+# checkpoint from one ordered pass over the ledger.
+def rebuild_checkpoints(collection, every=None):
+    every = every or CHECKPOINT_EVERY
+    ensure_indexes(collection)
+    unsequenced = [e["_id"] for e in collection.find({"$and": [EXPENSE_FILTER, {"seq": {"$exists": False}}]}, {"_id": 1}).sort("_id", 1)]
+    if unsequenced:
+        first_seq = _allocate_seq(collection, len(unsequenced))
+        collection.bulk_write([UpdateOne({"_id": _id}, {"$set": {"seq": first_seq + i}}) for i, _id in enumerate(unsequenced)], ordered=False)
+        # Readers fetch deltas by seq; these are not new, so they reload.
+        bump_version(collection, rewrite=True)
+    drop_checkpoints(collection)
+    summary, written = _empty_summary(), 0
+    for e in map(expense_decoder(collection), collection.find(EXPENSE_FILTER, _SUMMARY_FIELDS).sort("seq", 1)):
+        _accumulate(summary, e)
+        if e["seq"] % every == 0:
+            doc = _encode(summary, "checkpoint")
+            doc["seq"] = e["seq"]
+            collection.replace_one({"_id": _checkpoint_id(e["seq"])}, doc, upsert=True)
+            written += 1
+    return written
+
+
+# --- Command Line ---
+# python trip_summary.py <command> <db_name> <trip_name> [<trip_name> ...]
+#   rebuild              recompute the summary document from raw expenses
+#   check                compare summary document and aggregation with Python
+#   verify-checkpoints   compare every checkpoint with a full recompute
+#   rebuild-checkpoints  drop and rewrite all checkpoints
+COMMANDS = ("rebuild", "check", "verify-checkpoints", "rebuild-checkpoints")
+
+if __name__ == "__main__":
+    import trip_db
+
+    usage = f"usage: python trip_summary.py {{{','.join(COMMANDS)}}} <db_name> <trip_name> [<trip_name> ...]"
+    if len(sys.argv) < 4 or sys.argv[1] not in COMMANDS:
+        sys.exit(usage)
+    command = sys.argv[1]
+    config = trip_db.load_config()
+    failed = False
+    for trip_name in sys.argv[3:]:
+        collection = trip_db.get_trip_collection(config, sys.argv[2], trip_name)
+        if command == "rebuild":
+            s = rebuild_summary(collection)
+            print(f"{trip_name}: {s['count']} expenses, total ₹{money.to_rupees(s['total']):.2f}")
+        elif command == "rebuild-checkpoints":
+            print(f"{trip_name}: {rebuild_checkpoints(collection)} checkpoints written")
+        elif command == "verify-checkpoints":
+            for seq, mismatches in verify_checkpoints(collection):
+                failed = failed or bool(mismatches)
+                print(f"{trip_name} / checkpoint {seq}: {'OK' if not mismatches else 'MISMATCH'}")
+                for field, expected, actual in mismatches:
+                    print(f"    {field}: expenses={expected} checkpoint={actual}")
+        else:
+            # Python over raw expenses is the reference; the stored document,
+            # the aggregation pipeline and checkpoint + delta must agree with it.
+            reference = compute_summary(collection)
+            others = (
+                ("summary document", load_summary(collection)),
+                ("aggregation", aggregate_summary(collection)),
+                ("checkpoint + delta", checkpoint_summary(collection)),
+            )
+            for label, other in others:
+                mismatches = compare_summaries(reference, other) if other else [("missing", None, None)]
+                failed = failed or bool(mismatches)
+                print(f"{trip_name} / {label}: {'OK' if not mismatches else 'MISMATCH'}")
+                for field, expected, actual in mismatches:
+                    print(f"    {field}: python={expected} {label}={actual}")
+    sys.exit(1 if failed else 0)